@@ -1,483 +1,429 @@
+import time
+_script_start = time.perf_counter()
+
+import json
+import os
+import tempfile
+import uuid
+
 import streamlit as st
-from io import BytesIO
-from docx import Document
-from docx.shared import Mm, Pt, Inches
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.enum.table import WD_TABLE_ALIGNMENT
+from bill_layout import BILL_DEFAULTS, bill_layout, display_values, resolve_bill
+from diary import COLUMNS, LEG_COLUMNS, journeys_amount, parse_journeys
+from fonts import FAMILY, font_face_css
+from gujarati import parse_amount
+from jobs import CANCELLED, DONE, FAILED, FINISHED, QUEUED, RUNNING, JobQueue
+from layout import HtmlRenderer, html_css, minify_css
+from pdf_export import pdf_available
+from receipts import RECEIPT_TYPES, store_receipt
+from register import BillRegister
+from timings import METRICS, METRICS_MEMORY, RunMetrics, prometheus_text, report_startup, timed
+
+# python-docx, the batch pipeline and the PDF pool are only imported once a
+# download or batch run is actually requested, so the preview paints first.
+_imports_done = time.perf_counter()
 
 # ---------------------------------------------------------
-# 1. HELPER FUNCTION: GENERATE WORD DOCUMENT
+# 1. CACHED DOCUMENT BUILD
 # ---------------------------------------------------------
-def create_docx():
-    doc = Document()
-    
-    # Configure Page Size (A4) and Margins
-    section = doc.sections[0]
-    section.page_height = Mm(297)
-    section.page_width = Mm(210)
-    section.left_margin = Mm(20)
-    section.right_margin = Mm(15)
-    section.top_margin = Mm(15)
-    section.bottom_margin = Mm(15)
-
-    style = doc.styles['Normal']
-    font = style.font
-    font.name = 'Arial'  # Fallback font, systems handle Gujarati differently
-    font.size = Pt(11)
-
-    # --- PAGE 1 ---
-
-    # Top Right: Hisabi Patrak
-    p = doc.add_paragraph()
-    p.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-    run = p.add_run("હિસાબી પત્રક નંબર ____________")
-    
-    # Center Header
-    p = doc.add_paragraph()
-    p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    run = p.add_run("નવસારી કૃષિ વિશ્વવિધાલય\n")
-    run.bold = True
-    run.font.size = Pt(16)
-    run = p.add_run("મુસાફરી ભથ્થા બીલ")
-    run.bold = True
-    run.font.size = Pt(14)
-
-    # Info Table (Bill No vs Voucher No)
-    table = doc.add_table(rows=1, cols=2)
-    table.width = Mm(175)
-    table.autofit = False
-    
-    # Left Column
-    cell_l = table.cell(0, 0)
-    cell_l.width = Mm(80)
-    p = cell_l.paragraphs[0]
-    p.add_run("બીલ નંબર :\nતારીખ       :")
-    p.runs[0].bold = True
-
-    # Right Column
-    cell_r = table.cell(0, 1)
-    cell_r.width = Mm(95)
-    p = cell_r.paragraphs[0]
-    p.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-    p.add_run("વાઉચર નં. ____________________\n")
-    p.add_run("તારીખ ____________________\n")
-    p.add_run("યુનિટ નંબર : __________________\n")
-    p.add_run("કોડ નંબર : ____________________")
-
-    doc.add_paragraph() # Spacer
-
-    # Main Body Text
-    p = doc.add_paragraph("આચાર્ય અને ડીનશ્રી, નં. મ. કૃષિ મહાવિદ્યાલય, નકૃયું, નવસારી ની કચેરીનું માહે: ઓક્ટોમ્બર - ૨૦૨૫ નું")
-    p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    p.runs[0].bold = True
-
-    p = doc.add_paragraph("મુસાફરી ભથ્થા બિલ")
-    p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    p.runs[0].bold = True
-    p.runs[0].underline = True
-    p.runs[0].font.size = Pt(14)
-
-    p = doc.add_paragraph("યુનિટ/સબયુનિટ : આચાર્ય અને ડીનશ્રી, ન. મ. કૃષિ મહાવિદ્યાલય, નકૃયું, નવસારી")
-    p = doc.add_paragraph("ખર્ચ માટેનું બજેટ સદર :- ____________________")
-    p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    p = doc.add_paragraph("યોજનાનું નામ :- ____________________")
-    p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-
-    doc.add_paragraph() # Spacer
-
-    # Claim Amount
-    p = doc.add_paragraph()
-    p.add_run("આથી રૂ।. ")
-    r = p.add_run(" 12161 ")
-    r.bold = True
-    r.underline = True
-    p.add_run(" નો દાવો મંજુર કરી ગ્રાહય રાખવામાં આવે છે.")
-
-    # Boxed Amount Area (Simulated with borders)
-    tbl_amt = doc.add_table(rows=1, cols=1)
-    tbl_amt.style = 'Table Grid'
-    cell = tbl_amt.cell(0,0)
-    p = cell.paragraphs[0]
-    p.add_run("આ બીલમાં જણાવેલ રૂા  ")
-    p.add_run("12161").bold = True
-    p.add_run("  ( અંકે રૂપિયા ")
-    p.add_run("બાર હજાર એકસો એકસઠ પુરા").bold = True
-    p.add_run(" પૈસા )\n\n")
-    p.add_run("મંજુર કરવામાં આવે છે. અને તે રોકડા / ચેક નં. ______________ તા. ___________ થી ચુકવવામાં આવે છે.")
-
-    doc.add_paragraph() # Spacer
-
-    # Signatures
-    sig_table = doc.add_table(rows=1, cols=2)
-    sig_table.width = Mm(175)
-    
-    l_cell = sig_table.cell(0, 0)
-    l_cell.text = "સ્થળ :    નવસારી\nતારીખ :"
-    
-    r_cell = sig_table.cell(0, 1)
-    p = r_cell.paragraphs[0]
-    p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    p.add_run("____________________\n")
-    p.add_run("બીલ મંજુર કરનાર અધિકારીની\nસહી અને હોદ્દો")
-
-    doc.add_paragraph() # Spacer
-
-    # Budget Table
-    b_table = doc.add_table(rows=4, cols=3)
-    b_table.style = 'Table Grid'
-    hdr_cells = b_table.rows[0].cells
-    hdr_cells[0].text = ""
-    hdr_cells[1].text = "રૂ."
-    hdr_cells[2].text = "પૈસા"
-    
-    b_table.cell(1, 0).text = "(૧) સને ૨૦૨૪-૨૫ માટે બજેટમાં મંજુર થયેલ રકમ"
-    b_table.cell(2, 0).text = "(૨) આ બીલ સાથે થયેલ કુલ ખર્ચ"
-    b_table.cell(3, 0).text = "(૩) ખર્ચ માટે બાકી રહેતી રકમ"
-
-    doc.add_paragraph() # Spacer
-
-    # Bottom Signature
-    p = doc.add_paragraph()
-    p.add_run("રૂા ( 12161 ) અંકે રૂપિયા : બાર હજાર એકસો એકસઠ પુરા મંજુર કર્યા")
-    
-    p = doc.add_paragraph()
-    p.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-    p.add_run("નિયંત્રણ અધિકારીની સહી___________").bold = True
-
-    doc.add_page_break()
-
-    # --- PAGE 2 ---
-
-    p = doc.add_paragraph("નોંધ :-")
-    p.runs[0].bold = True
-    
-    notes = [
-        "કોલમ નં. ૭ માં મુસાફરી પ્રકાર રેલ્વે/એસ.ટી./હવાઈ/સ્ટીમર/ભાડાનું યુનિવર્સિટી કે સરકારી કે પોતાનું વાહન ઈત્યાદી મારફત કરેલ મુસાફરીની સ્પષ્ટ નોંધ આપવી.",
-        "કોલમ નં. ૧૧ થી ૧૩ માઈલેજ મેળવતા અધિકારીઓ કે સભ્યોએ ભરવી.",
-        "કોલમ નં. ૧૬ માં માત્ર દૈનિક ભથ્થાની રકમ લેવી જેથી કોલમ (૧૪ X ૧૫= ૧૬) થઈ રહેવું જોઈએ.",
-        "જયારે મુસાફરી ભથ્થા બીલમાં શરૂઆતમાં મુસાફરીને બદલે 'હોલ્ટ' દર્શાવવામાં આવેલ હોય તેવા કિસ્સામાં 'હોલ્ટ' ની શરૂઆત થયાની તારીખ કો.નં. ૧૯ માં દર્શાવવી."
-    ]
-    for note in notes:
-        doc.add_paragraph(note, style='List Number')
-
-    doc.add_paragraph()
-    p = doc.add_paragraph("યુનિવર્સિટી કર્મચારીએ આપવાનું પ્રમાણપત્ર")
-    p.runs[0].bold = True
-    
-    certs = [
-        "આથી પ્રમાણપત્ર આપવામાં આવે છે કે, આ બીલમાં આકારેલ રકમ બીજા કોઈ બીલમાં આકારેલ નથી.",
-        "આથી પ્રમાણીત કરવામાં આવે છે કે સદર મુસાફરી ભથ્થા બીલમાં દર્શાવેલ હકીકત સાચી છે...",
-        "આથી પ્રમાણપત્ર આપવામાં આવે છે કે બીલમાં દર્શાવેલ પ્રવાસ માટે મેં આ અગાઉ પેશગી લીધેલ નથી...",
-        "આ બીલમાં જણાવેલ યુનિવર્સિટી સિવાયની અન્ય સંસ્થાની ભ્રમગીરીના પ્રવાસ માટે...",
-        "આથી પ્રમાણપત્ર આપવામાં આવે છે કે, પ્રવાસ ડાયરીમાં દર્શાવવામાં આવેલ સ્થળ, તારીખ, સમય..."
-    ]
-    for cert in certs:
-        doc.add_paragraph(cert, style='List Number')
-
-    # Employee Signature
-    p = doc.add_paragraph()
-    p.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-    p.add_run("(સચિન આર. પટેલ)\n").bold = True
-    p.add_run("સહ પ્રાધ્યાપક\nકર્મચારીની સહી નામ અને હોદ્દો")
-
-    doc.add_paragraph("_" * 50) # Horizontal Line simulation
-
-    # Officer Cert
-    p = doc.add_paragraph("યુનિવર્સિટી અધિકારીઓ અને અન્ય સભ્યોએ આપવાનું પ્રમાણપત્ર")
-    p.runs[0].bold = True
-    doc.add_paragraph("આથી પ્રમાણિત કરવામાં આવે છે કે સદર બીલમાં કરેલ મુસાફરી ભથ્થાનો દાવો આ અંગેના નિયમોની જોગવાઈઓના આધારે ખરો અને યોગ્ય છે.")
-
-    # Officer Signature
-    p = doc.add_paragraph()
-    p.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-    p.add_run("_______________________\n")
-    p.add_run("પ્રાધ્યાપક અને વડા\nકિટકશાત્ર વિભાગ\nનં. મ. કૃષિ મહાવિદ્યાલય\nનકૃયું, નવસારી").bold = True
-
-    doc.add_paragraph()
-
-    # --- FINAL SPLIT TABLE (CALCULATION & RECEIPT) ---
-    p = doc.add_paragraph("કર્મચારી / અધિકારી / સભ્યશ્રીએ નીચેની વિગત ભરવી.")
-    p.runs[0].bold = True
-
-    final_table = doc.add_table(rows=1, cols=2)
-    final_table.style = 'Table Grid'
-    final_table.allow_autofit = False
-    
-    # Left Cell (Calculation)
-    c1 = final_table.cell(0, 0)
-    c1.width = Mm(90)
-    p = c1.paragraphs[0]
-    p.add_run("બીલની કુલ રકમ\t= 12161\n")
-    p.add_run("બાદ બીલની પેશગીની રકમ\t=\n")
-    p.add_run("ચૂકવવા પાત્ર ચોખ્ખી રકમ\t= 12161\n\n")
-    p.add_run("પેશગીના નાણાં મળ્યાની તા.\n")
-    p.add_run("પેશગી કયા ઝોન /યુનિટમાંથી\t નીલ\nઉપાડવામાં આવી.\n\n")
-    p.add_run("પેશગી ઉપાડવાના વાઉચર નંબર ______ તારીખ _____")
-
-    # Right Cell (Receipt)
-    c2 = final_table.cell(0, 1)
-    c2.width = Mm(90)
-    p = c2.paragraphs[0]
-    p.add_run("બીલની રકમ રૂ. 12161\n").bold = True
-    p.add_run("અંકે રૂપિયા બાર હજાર એકસો એકસઠ પુરા\n").bold = True
-    p.add_run("મને મળ્યા છે.\n\n")
-    p.add_run("સ્થળ : નવસારી\n")
-    p.add_run("તારીખ :\n\n\n")
-    p.add_run("                                        (સચિન આર. પટેલ)\n").bold = True
-    p.add_run("                                        સહ પ્રાધ્યાપક")
-
-    return doc
+# Rendered bills live in the on-disk artifact store shared by every server
+# process on the host, keyed on the bill's values. A bill is written straight
+# into its file there and handed to the download button as an open file, which
+# Streamlit reads once: no copy of the document is kept in this process (a
+# bill with a few dozen receipt scans runs to tens of MB).
+@st.cache_resource
+def artifact_store():
+    from artifacts import ArtifactStore
+
+    return ArtifactStore()
+
+
+def docx_file(bill_items):
+    from bill_docx import render_docx_to, template_version
+
+    return artifact_store().open_or_write(
+        "docx", bill_items, template_version(), "docx", lambda f: render_docx_to(f, dict(bill_items)))
+
+
+def pdf_file(bill_items):
+    from bill_docx import template_version
+
+    # The .docx is fetched (or built) before open_or_write() locks the PDF's
+    # stripe: stripe locks are not re-entrant, and holding one while taking
+    # another could deadlock against a session locking them the other way round.
+    with docx_file(bill_items) as docx:
+        return artifact_store().open_or_write(
+            "pdf", bill_items, template_version(), "pdf", lambda f: f.write(pdf_pool().convert(docx.read())))
+
+# One LibreOffice converter pool per server process, shared by all sessions
+@st.cache_resource
+def pdf_pool():
+    from pdf_export import PdfConverterPool
+
+    return PdfConverterPool(size=int(os.environ.get("PDF_WORKERS", "2")))
+
+# Background jobs (batch exports) share one bounded queue per server process
+@st.cache_resource
+def job_queue():
+    return JobQueue(workers=int(os.environ.get("JOB_WORKERS", "2")))
+
+# The bill register (SQLite) is opened once per server process as well
+@st.cache_resource
+def bill_register():
+    return BillRegister()
 
 # ---------------------------------------------------------
 # 2. STREAMLIT APP LOGIC
 # ---------------------------------------------------------
 st.set_page_config(layout="wide", page_title="Navsari Uni Bill - Final Layout")
 
-# Generate the Word file in memory
-doc = create_docx()
-buffer = BytesIO()
-doc.save(buffer)
-buffer.seek(0)
-
-# Sidebar Download Button
-st.sidebar.title("Download Options")
-st.sidebar.download_button(
-    label="Download as Word (.docx)",
-    data=buffer,
-    file_name="Navsari_Uni_Bill.docx",
-    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+# Instrumentation (see timings.py): on for every session with BILL_METRICS=1,
+# or for one session (with a panel in the sidebar) by opening it with ?metrics=1
+show_metrics = st.query_params.get("metrics") == "1"
+metrics = RunMetrics(enabled=METRICS or show_metrics, memory=METRICS_MEMORY)
+
+register = bill_register()
+queue = job_queue()
+if "session_id" not in st.session_state:
+    st.session_state["session_id"] = uuid.uuid4().hex
+session_id = st.session_state["session_id"]
+# Bill fields are edited in a sidebar form: typing doesn't rerun the script,
+# only submitting does, and the preview then re-renders just the blocks (and
+# pages) that use a changed field. The .docx is only built on download.
+FORM_FIELDS = (
+    ("month", "Month"),
+    ("amount", "Amount (Rs.)"),
+    ("employee_name", "Employee name"),
+    ("designation", "Designation"),
+    ("pay_level", "Pay level (for the TA/DA rules)"),
+    ("department", "Department"),
+    ("budget_head", "Budget head"),
+    ("budget_year", "Financial year"),
+    ("scheme_name", "Scheme name"),
+    ("unit_code", "Unit code"),
+    ("voucher_no", "Voucher no."),
+    ("voucher_date", "Voucher date"),
+    ("cheque_no", "Cheque no."),
+    ("cheque_date", "Cheque date"),
 )
 
+if "bill" not in st.session_state:
+    st.session_state["bill"] = dict(BILL_DEFAULTS)
+
+# Travel diary: one row per journey leg; its total becomes the claim amount
+# (the editor is only built when opened: it pulls in pandas and pyarrow)
+if st.toggle("Edit travel diary (journey legs)"):
+    with st.form("diary_form"):
+        legs = st.data_editor(
+            [{name: leg.get(name, "") for name in LEG_COLUMNS}
+             for leg in parse_journeys(st.session_state["bill"]["journeys"])] or [dict.fromkeys(LEG_COLUMNS, "")],
+            num_rows="dynamic",
+            width="stretch",
+            column_config={name: st.column_config.TextColumn(f"{column}. {COLUMNS[column - 1]}")
+                           for name, column in LEG_COLUMNS.items()},
+        )
+        if st.form_submit_button("Update diary"):
+            legs = [{name: str(value) for name, value in leg.items() if value not in (None, "")} for leg in legs]
+            legs = [leg for leg in legs if leg]
+            journeys = json.dumps(legs, ensure_ascii=False) if legs else ""
+            try:
+                amount = journeys_amount(journeys)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                st.session_state["bill"] = {**st.session_state["bill"], "journeys": journeys}
+                if amount is not None:
+                    st.session_state["bill"]["amount"] = st.session_state["bill_amount"] = amount
+with st.sidebar.form("bill_form"):
+    st.subheader("Bill details")
+    for name, _ in FORM_FIELDS:
+        st.session_state.setdefault("bill_" + name, st.session_state["bill"][name])
+    edited = {name: st.text_input(label, key="bill_" + name).strip() for name, label in FORM_FIELDS}
+    if st.session_state["bill"]["journeys"]:
+        st.caption("The amount is the travel diary's total.")
+    if st.form_submit_button("Update preview", type="primary"):
+        try:
+            parse_amount(edited["amount"])
+        except ValueError as e:
+            st.error(str(e))
+        else:
+            st.session_state["bill"] = {**st.session_state["bill"], **edited}
+
+# Receipt scans are stored once by content hash (see receipts.py); the bill
+# lists their names and the Word file prints them on pages after the bill
+scans = st.sidebar.file_uploader("Receipts (scanned tickets, hotel bills)", type=list(RECEIPT_TYPES),
+                                 accept_multiple_files=True)
+stored_scans = st.session_state.setdefault("receipt_names", {})
+for scan in scans:
+    if scan.file_id not in stored_scans:
+        stored_scans[scan.file_id] = store_receipt(scan, scan.name)
+receipts = "\n".join(stored_scans[scan.file_id] for scan in scans)
+if receipts != st.session_state["bill"]["receipts"]:
+    st.session_state["bill"] = {**st.session_state["bill"], "receipts": receipts}
+if scans:
+    st.sidebar.caption(f"{len(scans)} receipts are printed after the bill in the Word file.")
+
+bill = resolve_bill(st.session_state["bill"])
+# Budget table: running totals of the bill's budget head, with this bill added.
+# Once the bill is saved its amount is in the register's total, so the saved
+# fields are shown as they are instead of counting it a second time.
+bill_inputs = tuple(sorted(bill.items()))
+saved = st.session_state.get("saved_bill")
+if saved is not None and saved["inputs"] == bill_inputs:
+    bill = saved["fields"]
+else:
+    bill.update(register.budget_fields(bill))
+bill_items = tuple(sorted(bill.items()))
+metrics.lap("inputs")
+
 # ---------------------------------------------------------
-# 3. CSS for HTML Preview (Existing Code)
+# 3. CSS for HTML Preview
 # ---------------------------------------------------------
-st.markdown("""
-<style>
-    @import url('https://fonts.googleapis.com/css2?family=Noto+Sans+Gujarati:wght@400;600;700&display=swap');
+# Built once per server process: the page rules plus one rule per class the
+# preview markup uses (see layout.html_css), all minified.
+PAGE_CSS = """
     .stApp { background-color: #555; }
     .a4-page {
         background-color: white; color: black; width: 210mm; min-height: 297mm;
-        padding: 15mm 20mm; margin: 10px auto;
-        font-family: 'Noto Sans Gujarati', sans-serif; font-size: 13px; line-height: 1.5;
+        padding: 15mm 15mm 15mm 20mm; margin: 10px auto;
+        font-family: '%s', sans-serif; font-size: 11pt; line-height: 1.5;
         box-shadow: 0 0 15px rgba(0,0,0,0.5);
     }
-    .input-line { border-bottom: 1px solid black; display: inline-block; padding: 0 5px; }
-    table.budget-table { width: 100%; border-collapse: collapse; margin-top: 10px; font-size: 12px; }
-    table.budget-table th, table.budget-table td { border: 1px solid black; padding: 8px; vertical-align: middle; }
-    table.budget-table th { text-align: center; font-weight: bold; }
-    table.budget-table td { height: 35px; }
-    .bold { font-weight: 700; }
-    .center { text-align: center; }
-    .right { text-align: right; }
-    .flex-row { display: flex; justify-content: space-between; align-items: flex-end; }
-</style>
-""", unsafe_allow_html=True)
+    .a4-page p { margin: 0 0 6pt; min-height: 1.5em; white-space: pre-wrap; tab-size: 4; }
+    .a4-page ol { margin: 0 0 6pt; padding-left: 20px; }
+    .a4-page table { width: 100%%; border-collapse: collapse; margin-bottom: 6pt; }
+    .a4-page td { padding: 4px 6px; vertical-align: top; }
+    .a4-page td p { margin: 0; }
+    .a4-page table.g td { border: 1px solid black; }
+"""
+
+
+@st.cache_resource
+def preview_css():
+    return "<style>%s%s%s</style>" % (
+        minify_css(font_face_css()), minify_css(PAGE_CSS % FAMILY), html_css(bill_layout(), ".a4-page"))
+
+
+css = preview_css()
+metrics.lap("fonts_css")
+st.markdown(css, unsafe_allow_html=True)
+metrics.add("css_bytes", len(css.encode("utf-8")))
+metrics.lap("css_markdown")
 
 # ---------------------------------------------------------
-# PAGE 1 PREVIEW HTML
+# 4. HTML PREVIEW (rendered from the same layout as the DOCX)
 # ---------------------------------------------------------
-page1_html = """
-<div class="right" style="margin-bottom: 10px; font-size: 12px;">
-હિસાબી પત્રક નંબર <span class="input-line" style="width:100px;"></span>
-</div>
-<div class="center">
-<div style="font-size: 22px; font-weight: 700;">નવસારી કૃષિ વિશ્વવિધાલય</div>
-<div style="font-size: 16px; font-weight: 700; margin-top: 5px;">મુસાફરી ભથ્થા બીલ</div>
-</div>
-<div class="flex-row" style="margin-top: 20px;">
-<div style="width: 40%; font-weight: 700; font-size: 14px;">
-<div style="margin-bottom: 10px;">બીલ નંબર :</div>
-<div>તારીખ &nbsp;&nbsp;&nbsp;:</div>
-</div>
-<div style="width: 50%; text-align: right; font-size: 12px;">
-<div style="margin-bottom: 5px;">વાઉચર નં. <span class="input-line" style="width:180px;"></span></div>
-<div style="margin-bottom: 5px;">તારીખ <span class="input-line" style="width:180px;"></span></div>
-<div style="margin-bottom: 5px;">યુનિટ નંબર : <span class="input-line" style="width:165px;"></span></div>
-<div>કોડ નંબર : <span class="input-line" style="width:180px;"></span></div>
-</div>
-</div>
-<div class="center" style="margin-top: 20px; font-weight: 700; font-size: 12px;">
-આચાર્ય અને ડીનશ્રી, નં. મ. કૃષિ મહાવિદ્યાલય, નકૃયું, નવસારી ની કચેરીનું માહે: ઓક્ટોમ્બર - ૨૦૨૫ નું
-</div>
-<div class="center" style="margin-top: 5px;">
-<span style="font-size: 16px; font-weight: 700; border-bottom: 2px solid black; padding-bottom: 2px;">મુસાફરી ભથ્થા બિલ</span>
-</div>
-<div style="margin-top: 20px; font-weight: 600; font-size: 12px;">
-યુનિટ/સબયુનિટ : આચાર્ય અને ડીનશ્રી, ન. મ. કૃષિ મહાવિદ્યાલય, નકૃયું, નવસારી
-</div>
-<div class="center" style="margin-top: 15px; font-weight: 600;">
-ખર્ચ માટેનું બજેટ સદર :-
-</div>
-<div class="center" style="margin-top: 5px; font-weight: 600;">
-યોજનાનું નામ :-
-</div>
-<div style="margin-top: 15px; font-size: 14px;">
-આથી રૂા. <span class="input-line" style="width: 150px; text-align:center; font-weight:bold;">12161</span> ના દાવો મંજુર કરી ગ્રાહય રાખવામાં આવે છે.
-</div>
-<div style="margin-top: 10px; border-top: 1px solid black; padding-top: 10px;">
-<div style="line-height: 2;">
-આ બીલમાં જણાવેલ રૂા <span class="input-line" style="width: 80px; text-align:center; font-weight:bold;">12161</span> (
-<span style="margin-left: 20px;">અંકે રૂપિયા <span style="font-weight:bold; font-size:14px;">બાર હજાર એકસો એકસઠ પુરા</span></span>
-<span style="float:right;">પૈસા)</span>
-<br>
-મંજુર કરવામાં આવે છે. અને તે રોકડા / ચેક નં. <span class="input-line" style="width: 150px;"></span> તા. <span class="input-line" style="width: 100px;"></span> થી ચુકવવામાં આવે છે.
-</div>
-</div>
-<div class="flex-row" style="margin-top: 20px;">
-<div>
-સ્થળ : &nbsp;&nbsp;&nbsp;નવસારી<br>
-તારીખ :
-</div>
-<div style="text-align: center;">
-બીલ મંજુર કરનાર અધિકારીની<br>
-સહી અને હોદ્દો
-</div>
-</div>
-<hr style="border-top: 2px solid black; margin: 15px 0;">
-<table class="budget-table">
-<colgroup>
-<col style="width: 70%;">
-<col style="width: 15%;">
-<col style="width: 15%;">
-</colgroup>
-<thead>
-<tr>
-<th rowspan="2" style="text-align:left; border-bottom: none;"></th>
-<th>રૂ.</th>
-<th>પૈસા</th>
-</tr>
-<tr>
-<th style="height:20px;"></th>
-<th style="height:20px;"></th>
-</tr>
-</thead>
-<tbody>
-<tr>
-<td>(૧) સને ૨૦૨૪-૨૫ માટે બજેટમાં મંજુર થયેલ રકમ</td>
-<td></td>
-<td></td>
-</tr>
-<tr>
-<td>(૨) આ બીલ સાથે થયેલ કુલ ખર્ચ</td>
-<td></td>
-<td></td>
-</tr>
-<tr>
-<td>(૩) ખર્ચ માટે બાકી રહેતી રકમ</td>
-<td></td>
-<td></td>
-</tr>
-</tbody>
-</table>
-<div style="margin-top: 15px; font-size: 13px;">
-રૂા ( <span class="input-line" style="width: 100px; text-align:center; font-weight:bold;">12161</span> ) અંકે રૂપિયા : <span class="input-line" style="width: 350px; font-weight:bold;">બાર હજાર એકસો એકસઠ પુરા</span> મંજુર કર્યા
-</div>
-<div style="text-align: right; margin-top: 40px; font-weight: 600;">
-નિયંત્રણ અધિકારીની સહી___________
-</div>
-"""
+# One renderer per session: reruns only re-render the blocks whose bound
+# fields changed since the last run, and unchanged pages come back as the
+# same string (so the browser has nothing to re-lay out).
+if "preview_renderer" not in st.session_state:
+    st.session_state["preview_renderer"] = HtmlRenderer(bill_layout())
+renderer = st.session_state["preview_renderer"]
+pages = renderer.render_pages(display_values(bill))
+metrics.add("blocks_rendered", renderer.rendered)
+metrics.add("pages_changed", len(renderer.changed_pages))
+metrics.lap("preview_render")
 
 # ---------------------------------------------------------
-# PAGE 2 PREVIEW HTML
+# RENDER COLUMNS (two pages side by side; a long diary adds more pages)
 # ---------------------------------------------------------
-page2_html = """
-<div style="font-size: 11px;">
-<strong>નોંધ :-</strong>
-<ol style="margin-top: 5px; padding-left: 20px; margin-bottom: 10px;">
-<li>કોલમ નં. ૭ માં મુસાફરી પ્રકાર રેલ્વે/એસ.ટી./હવાઈ/સ્ટીમર/ભાડાનું યુનિવર્સિટી કે સરકારી કે પોતાનું વાહન ઈત્યાદી મારફત કરેલ મુસાફરીની સ્પષ્ટ નોંધ આપવી.</li>
-<li>કોલમ નં. ૧૧ થી ૧૩ માઈલેજ મેળવતા અધિકારીઓ કે સભ્યોએ ભરવી.</li>
-<li>કોલમ નં. ૧૬ માં માત્ર દૈનિક ભથ્થાની રકમ લેવી જેથી કોલમ (૧૪ X ૧૫= ૧૬) થઈ રહેવું જોઈએ.</li>
-<li>જયારે મુસાફરી ભથ્થા બીલમાં શરૂઆતમાં મુસાફરીને બદલે 'હોલ્ટ' દર્શાવવામાં આવેલ હોય તેવા કિસ્સામાં 'હોલ્ટ' ની શરૂઆત થયાની તારીખ કો.નં. ૧૯ માં દર્શાવવી.</li>
-</ol>
-</div>
-<div style="margin-top: 10px;">
-<strong>યુનિવર્સિટી કર્મચારીએ આપવાનું પ્રમાણપત્ર</strong>
-<ol style="margin-top: 5px; padding-left: 20px;">
-<li>આથી પ્રમાણપત્ર આપવામાં આવે છે કે, આ બીલમાં આકારેલ રકમ બીજા કોઈ બીલમાં આકારેલ નથી.</li>
-<li>આથી પ્રમાણીત કરવામાં આવે છે કે સદર મુસાફરી ભથ્થા બીલમાં દર્શાવેલ હકીકત સાચી છે... (નિયમોના ૬૫-૧ ના અનુમાનોને આધારે સાચો છે).</li>
-<li>આથી પ્રમાણપત્ર આપવામાં આવે છે કે બીલમાં દર્શાવેલ પ્રવાસ માટે મેં આ અગાઉ પેશગી લીધેલ નથી / <span style="text-decoration: line-through;">મે પેશગી લીધેલ છે...</span></li>
-<li>આ બીલમાં જણાવેલ યુનિવર્સિટી સિવાયની અન્ય સંસ્થાની ભ્રમગીરીના પ્રવાસ માટે... (નાણાં મળશે તો જમા કરાવવામાં આવશે).</li>
-<li>આથી પ્રમાણપત્ર આપવામાં આવે છે કે, પ્રવાસ ડાયરીમાં દર્શાવવામાં આવેલ સ્થળ, તારીખ, સમય, કિલોમીટર કચેરીના વાહન લોગબુક મુજબ આકારવામાં આવેલ છે.</li>
-</ol>
-</div>
-<div class="flex-row" style="margin-top: 20px;">
-<div></div>
-<div style="text-align: center;">
-<strong>(સચિન આર. પટેલ)</strong><br>
-સહ પ્રાધ્યાપક<br>
-કર્મચારીની સહી નામ અને હોદ્દો
-</div>
-</div>
-<div class="center" style="margin-top: 30px; font-weight: 700; font-size: 14px;">
-યુનિવર્સિટી અધિકારીઓ અને અન્ય સભ્યોએ આપવાનું પ્રમાણપત્ર
-</div>
-<div class="center" style="margin-top: 10px; font-size: 12px; font-weight: 600;">
-આથી પ્રમાણિત કરવામાં આવે છે કે સદર બીલમાં કરેલ મુસાફરી ભથ્થાનો દાવો આ અંગેના નિયમોની જોગવાઈઓના આધારે ખરો અને યોગ્ય છે.
-</div>
-<div style="margin-top: 20px; display: flex; justify-content: flex-end;">
-<div style="text-align: center; font-weight: 700; font-size: 13px; line-height: 1.4;">
-પ્રાધ્યાપક અને વડા<br>
-કિટકશાત્ર વિભાગ<br>
-નં. મ. કૃષિ મહાવિદ્યાલય<br>
-નકૃયું, નવસારી
-</div>
-</div>
-<div style="margin-top: 10px; font-weight: 700; font-size: 13px; border-bottom: 2px solid black; padding-bottom: 2px;">
-કર્મચારી / અધિકારી / સભ્યશ્રીએ નીચેની વિગત ભરવી.
-</div>
-<div style="display: flex; border-bottom: 2px solid black;">
-<div style="width: 50%; border-right: 2px solid black; padding: 10px 10px 10px 0; font-weight: 600;">
-<div style="display: flex; justify-content: space-between; margin-bottom: 5px;">
-<span>બીલની કુલ રકમ</span>
-<span style="font-weight: 700; font-size: 14px;">= &nbsp;&nbsp; 12161</span>
-</div>
-<div style="display: flex; justify-content: space-between; margin-bottom: 5px;">
-<span>બાદ બીલની પેશગીની રકમ</span>
-<span style="font-weight: 700;">=</span>
-</div>
-<div style="display: flex; justify-content: space-between; margin-bottom: 15px;">
-<span>ચૂકવવા પાત્ર ચોખ્ખી રકમ</span>
-<span style="font-weight: 700; font-size: 14px;">= &nbsp;&nbsp; 12161</span>
-</div>
-<div style="margin-bottom: 5px;">પેશગીના નાણાં મળ્યાની તા.</div>
-<div style="margin-bottom: 5px; display: flex;">
-<span>પેશગી કયા ઝોન /યુનિટમાંથી<br>ઉપાડવામાં આવી.</span>
-<span style="margin-left: auto; align-self: center; font-weight: bold; margin-right: 20px;">નીલ</span>
-</div>
-<div style="margin-top: 15px;">
-પેશગી ઉપાડવાના વાઉચર નંબર<br>
-<div style="text-align: center; border-bottom: 1px solid black; width: 100px; margin-top: 5px;">&nbsp;</div>
-તારીખ
-</div>
-</div>
-<div style="width: 50%; padding: 10px 0 10px 10px; position: relative; font-weight: 600;">
-<div style="margin-bottom: 5px;">
-બીલની રકમ રૂ. <span style="font-weight: 700; border-bottom: 1px solid black; padding: 0 10px; font-size: 14px;">12161</span>
-</div>
-<div style="margin-bottom: 15px;">
-અંકે રૂપિયા <span style="font-weight: 700; border-bottom: 1px solid black; font-size: 14px;">બાર હજાર એકસો એકસઠ પુરા</span>
-</div>
-<div style="margin-bottom: 20px;">મને મળ્યા છે.</div>
-<div style="margin-bottom: 5px;">
-સ્થળ : <span style="border-bottom: 1px solid black;">નવસારી</span>
-</div>
-<div style="margin-bottom: 50px;">
-તારીખ :
-</div>
-<div style="text-align: center; position: absolute; bottom: 10px; right: 10px;">
-<div style="font-weight: 700;">(સચિન આર. પટેલ)</div>
-<div style="font-weight: 600;">સહ પ્રાધ્યાપક</div>
-<div style="font-weight: 600;">કર્મચારીની સહી</div>
-</div>
-</div>
-</div>
-"""
+for start in range(0, len(pages), 2):
+    for col, page_html in zip(st.columns(2), pages[start:start + 2]):
+        with col:
+            st.markdown(f'<div class="a4-page">{page_html}</div>', unsafe_allow_html=True)
+metrics.add("html_bytes", sum(len(page.encode("utf-8")) for page in pages))
+metrics.lap("preview_markdown")
+
+report_startup(_script_start, _imports_done, time.perf_counter())
+
+def limit_to_entitlements():
+    # A callback, so the amount field can still be updated before it is drawn
+    from rules import apply_entitlements
+
+    journeys = apply_entitlements([st.session_state["bill"]])[0]["journeys"]
+    amount = journeys_amount(journeys)
+    st.session_state["bill"] = {**st.session_state["bill"], "journeys": journeys, "amount": amount}
+    st.session_state["bill_amount"] = amount
+
+
+# TA/DA rule check of the travel diary (only bills with legs have anything to
+# check, so numpy/pandas are not loaded otherwise)
+if bill["journeys"]:
+    from rules import check_claims, entitlements
+
+    entitled = entitlements([bill])
+    if len(entitled):
+        st.caption("Entitled: fare Rs. %.2f, daily allowance Rs. %.2f, mileage Rs. %.2f" % tuple(entitled.iloc[0]))
+    violations = check_claims([bill]).get(1, [])
+    for message in violations:
+        st.warning(message)
+    if violations:
+        st.button("Limit the diary to the entitlements", on_click=limit_to_entitlements)
+    metrics.lap("rules")
 
 # ---------------------------------------------------------
-# RENDER COLUMNS
+# 5. SIDEBAR: DOWNLOADS, REGISTER AND BATCH GENERATION
 # ---------------------------------------------------------
-col1, col2 = st.columns(2)
-with col1:
-    st.markdown(f'<div class="a4-page">{page1_html}</div>', unsafe_allow_html=True)
-with col2:
-    st.markdown(f'<div class="a4-page">{page2_html}</div>', unsafe_allow_html=True)
+# Sidebar Download Button (the document is built when the button is clicked)
+st.sidebar.title("Download Options")
+st.sidebar.download_button(
+    label="Download as Word (.docx)",
+    data=lambda: timed("docx_download", docx_file, bill_items, enabled=metrics.enabled),
+    file_name="Navsari_Uni_Bill.docx",
+    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+)
+
+# Sidebar PDF Download
+if pdf_available():
+    st.sidebar.download_button(
+        label="Download as PDF",
+        data=lambda: timed("pdf_download", pdf_file, bill_items, enabled=metrics.enabled),
+        file_name="Navsari_Uni_Bill.pdf",
+        mime="application/pdf",
+    )
+else:
+    st.sidebar.caption("PDF export needs LibreOffice and unoserver on the server.")
+
+# Sidebar Bill Register (save this bill, search and re-download past ones)
+with st.sidebar.expander("Bill register"):
+    if saved is not None and saved["inputs"] == bill_inputs:
+        st.caption(f"Saved as bill #{saved['id']}")
+    elif st.button("Save bill to register"):
+        from bill_docx import TEMPLATE_VERSION
+
+        bill_id, fields = register.add_bill(bill, TEMPLATE_VERSION)
+        st.session_state["saved_bill"] = {"inputs": bill_inputs, "id": bill_id, "fields": fields}
+        st.success(f"Saved as bill #{bill_id}")
+
+    with st.form("budget_form"):
+        st.caption("Sanctioned budget")
+        budget_head = st.text_input("Budget head", value=bill["budget_head"])
+        budget_year = st.text_input("Financial year", value=bill["budget_year"])
+        sanctioned = st.text_input("Sanctioned amount")
+        if st.form_submit_button("Set budget") and budget_head:
+            try:
+                register.set_budget(budget_head, budget_year, sanctioned)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                # The budget table above was drawn before the budget existed
+                st.rerun()
+
+    st.caption("Search")
+    filters = {
+        "employee_name": st.text_input("Employee name"),
+        "month": st.text_input("Month"),
+        "budget_head": st.text_input("Budget head", key="search_budget_head"),
+        "unit_code": st.text_input("Unit code"),
+    }
+    found = register.search(limit=50, **filters)
+    if found:
+        st.dataframe(
+            [{k: row[k] for k in ("id", "employee_name", "month", "budget_head", "amount")} for row in found],
+            hide_index=True,
+        )
+        past_id = st.selectbox("Bill", [row["id"] for row in found])
+
+        def past_bill_docx():
+            return docx_file(tuple(sorted(register.get_bill(past_id).items())))
+
+        st.download_button(
+            label=f"Download bill #{past_id} (.docx)",
+            data=past_bill_docx,
+            file_name=f"Navsari_Uni_Bill_{past_id}.docx",
+            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        )
+
+# Sidebar Batch Generation (one bill per spreadsheet row). Runs as a
+# background job: this session stays responsive and polls for progress.
+def batch_job(job, claims, pool):
+    from batch import generate_batch
+
+    out = tempfile.NamedTemporaryFile(suffix=".zip", delete=False)
+    job.files.append(out.name)
+    with out:
+        result = generate_batch(claims, out, progress=job.report, total=len(claims), rules="warn")
+    pdf_zip = None
+    if pool is not None:
+        from pdf_export import convert_zip
+
+        pdf_zip = out.name[:-len(".zip")] + "_pdf.zip"
+        job.files.append(pdf_zip)
+        convert_zip(out.name, pdf_zip, pool, progress=job.report)
+    return {"zip": out.name, "pdf_zip": pdf_zip, "result": result}
+
+
+def read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@st.fragment(run_every=1.0 if any(j.status not in FINISHED for j in queue.jobs(session_id)) else None)
+def show_jobs():
+    jobs = queue.jobs(session_id)
+    if st.session_state.get("jobs_polling") and all(j.status in FINISHED for j in jobs):
+        # The last job just finished: one full rerun stops the polling
+        st.session_state["jobs_polling"] = False
+        st.rerun()
+    st.session_state["jobs_polling"] = any(j.status not in FINISHED for j in jobs)
+    for job in jobs:
+        st.markdown(f"**Job {job.id}** ({job.kind}): {job.status}")
+        if job.status in (QUEUED, RUNNING):
+            fraction = job.done / job.total if job.total else 0.0
+            st.progress(fraction, text=f"{job.done}/{job.total or '?'}")
+            st.button("Cancel", key=f"cancel_job_{job.id}", on_click=queue.cancel, args=(job.id,))
+        elif job.status == FAILED:
+            st.error(job.error)
+        elif job.status == CANCELLED:
+            st.caption(f"Cancelled after {job.done}/{job.total or '?'}")
+        elif job.status == DONE:
+            result = job.result["result"]
+            st.caption(f"{result.bills} bills, {result.bytes_written / 2**20:.1f} MB written")
+            for number, message in result.errors:
+                st.error(f"Row {number}: {message}")
+            for number, message in result.violations:
+                st.warning(f"Row {number}: {message}")
+            # The archives stay on disk; they are only read when a button is clicked
+            st.download_button(
+                label="Download bills (.zip)",
+                data=lambda path=job.result["zip"]: read_file(path),
+                file_name="Navsari_Uni_Bills.zip",
+                mime="application/zip",
+                key=f"download_job_{job.id}",
+            )
+            if job.result["pdf_zip"]:
+                st.download_button(
+                    label="Download PDFs (.zip)",
+                    data=lambda path=job.result["pdf_zip"]: read_file(path),
+                    file_name="Navsari_Uni_Bills_pdf.zip",
+                    mime="application/zip",
+                    key=f"download_pdf_job_{job.id}",
+                )
+
+
+with st.sidebar.expander("Batch generation (CSV / XLSX)"):
+    st.caption("Columns: " + ", ".join(BILL_DEFAULTS))
+    claims_file = st.file_uploader("Claims spreadsheet", type=["csv", "xlsx"])
+    to_pdf = pdf_available() and st.checkbox("Also convert to PDF")
+    if claims_file is not None and st.button("Generate all bills"):
+        from batch import fill_amount_words, read_claims
+
+        try:
+            # ValueError: not a readable CSV/.xlsx; RuntimeError: openpyxl
+            # missing, or the job queue is full
+            claims = fill_amount_words(list(read_claims(claims_file, claims_file.name)))
+            queue.submit("batch", batch_job, claims, pdf_pool() if to_pdf else None, owner=session_id)
+        except (ValueError, RuntimeError) as e:
+            st.error(str(e))
+        else:
+            # show_jobs' polling interval is fixed when it is defined above,
+            # before this job existed: rerun so that it starts polling
+            st.rerun()
+    show_jobs()
+metrics.lap("sidebar")
+
+# Instrumentation panel (?metrics=1)
+report = metrics.finish()
+if show_metrics:
+    with st.sidebar.expander("Instrumentation", expanded=True):
+        st.json(report)
+        st.code(prometheus_text(), language="text")
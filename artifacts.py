@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: writes stay atomic, only the locking is skipped
+    fcntl = None
+
+# ---------------------------------------------------------
+# 1. ARTIFACT STORE
+# ---------------------------------------------------------
+# Rendered outputs (.docx, .pdf) on local disk, addressed by a hash of the
+# bill's values, the output kind and the template version. Every Streamlit
+# replica on the host points at the same directory, so a bill rendered by one
+# worker is a file read for all the others.
+#
+#   <root>/ab/abcdef....docx    artifacts, fanned out by the first two hex digits
+#   <root>/locks/ab.lock        flock()ed while an artifact in "ab" is built
+#   <root>/locks/evict.lock     flock()ed while the store is trimmed
+#
+# Files are written to a temp file in the same directory and renamed into
+# place, so readers never see a partial artifact. A read refreshes the file's
+# mtime; once the store grows past max_bytes the least recently used files are
+# removed until it is back under 90% of the cap.
+ARTIFACT_DIR = os.environ.get("BILL_ARTIFACT_DIR", os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".artifacts"))
+MAX_BYTES = int(os.environ.get("BILL_ARTIFACT_MAX_MB", "512")) * 2**20
+
+
+def artifact_key(kind, values, version):
+    """Content address of an output: sha256 over the kind, template version
+    and the (sorted) bill values."""
+    payload = json.dumps([kind, version, sorted(dict(values).items())], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ArtifactStore:
+    def __init__(self, root=ARTIFACT_DIR, max_bytes=MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock_dir = os.path.join(root, "locks")
+        os.makedirs(self._lock_dir, exist_ok=True)
+        self._size_lock = threading.Lock()
+        self._size = None  # this process's estimate, re-measured on each trim
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key, ext):
+        return os.path.join(self.root, key[:2], "%s.%s" % (key, ext))
+
+    @contextmanager
+    def _locked(self, name):
+        with open(os.path.join(self._lock_dir, name + ".lock"), "a") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def open(self, key, ext):
+        """The stored artifact as an open binary file, or None. A file opened
+        here stays readable even if the artifact is evicted meanwhile."""
+        path = self.path(key, ext)
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:  # evicted by another process meanwhile
+            pass
+        return f
+
+    def write(self, key, ext, write):
+        """Store an artifact by calling `write(f)` on a temp file (opened for
+        reading and writing) that is then renamed into place. Returns the
+        stored file, open for reading."""
+        path = self.path(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        stored = None
+        try:
+            with os.fdopen(fd, "w+b") as f:
+                write(f)
+                size = f.seek(0, os.SEEK_END)
+            stored = open(tmp, "rb")
+            os.replace(tmp, path)
+        except BaseException:
+            if stored is not None:
+                stored.close()
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        self._grow(size)
+        return stored
+
+    def open_or_write(self, kind, values, version, ext, write):
+        """The stored artifact for these inputs, as an open binary file. On a
+        miss it is written straight to disk by `write(f)` (by one process at a
+        time per key prefix), so neither path holds the whole output in memory."""
+        key = artifact_key(kind, values, version)
+        f = self.open(key, ext)
+        if f is None:
+            with self._locked(key[:2]):
+                f = self.open(key, ext)
+                if f is None:
+                    self.misses += 1
+                    return self.write(key, ext, write)
+        self.hits += 1
+        return f
+
+    def _files(self):
+        for bucket in os.scandir(self.root):
+            if not bucket.is_dir() or bucket.name == "locks":
+                continue
+            for entry in os.scandir(bucket.path):
+                if entry.name.startswith(".tmp-"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime, stat.st_size, entry.path
+
+    def _grow(self, size):
+        with self._size_lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._files())
+            else:
+                self._size += size
+            over = self._size > self.max_bytes
+        if over:
+            self.trim()
+
+    def trim(self, target=None):
+        """Remove least recently used artifacts until the store is below
+        `target` bytes (default 90% of max_bytes). Returns bytes removed."""
+        target = int(self.max_bytes * 0.9) if target is None else target
+        removed = 0
+        with self._locked("evict"):
+            files = sorted(self._files())
+            total = sum(size for _, size, _ in files)
+            for _, size, path in files:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += size
+            # Leftovers of writers that died mid-write
+            stale = time.time() - 3600
+            for bucket in os.scandir(self.root):
+                if bucket.is_dir() and bucket.name != "locks":
+                    for entry in os.scandir(bucket.path):
+                        if entry.name.startswith(".tmp-"):
+                            try:
+                                if entry.stat().st_mtime < stale:
+                                    os.remove(entry.path)
+                            except FileNotFoundError:
+                                pass
+        with self._size_lock:
+            self._size = total
+        return removed
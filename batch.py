@@ -0,0 +1,336 @@
+import argparse
+import csv
+import io
+import multiprocessing
+import os
+import re
+import sys
+import tracemalloc
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from xml.etree.ElementTree import ParseError
+
+from bill_docx import TEMPLATE_VERSION, render_docx_bytes
+from bill_layout import BILL_DEFAULTS, resolve_bill
+from gujarati import convert_many, parse_amount
+from receipts import receipt_names, receipt_path
+
+# ---------------------------------------------------------
+# 1. READING CLAIMS
+# ---------------------------------------------------------
+# One claim per row; columns are named after the BILL_DEFAULTS fields
+# (amount, amount_words, month, employee_name, ...). Unknown columns are ignored
+# and missing ones fall back to the defaults; amount_words is written out from
+# the amount when blank. A receipts column lists image files in the receipt
+# directory (BILL_RECEIPT_DIR), separated by semicolons.
+REQUIRED_COLUMNS = ("amount", "employee_name")
+
+
+def _cell_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _read_csv(f):
+    text = io.TextIOWrapper(f, encoding="utf-8-sig", newline="")
+    yield from csv.DictReader(text)
+
+
+def _read_xlsx(f):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise RuntimeError("Reading .xlsx claims needs openpyxl (pip install openpyxl)")
+    sheet = load_workbook(f, read_only=True, data_only=True).active
+    rows = sheet.iter_rows(values_only=True)
+    header = [_cell_text(h) for h in next(rows, ())]
+    for values in rows:
+        if any(v is not None for v in values):
+            yield dict(zip(header, values))
+
+
+def read_claims(f, filename):
+    """Yield one bill dict per spreadsheet row from a binary file object.
+    Raises ValueError when the file isn't a readable UTF-8 CSV or .xlsx."""
+    reader = _read_xlsx if filename.lower().endswith(".xlsx") else _read_csv
+    try:
+        for row in reader(f):
+            yield {k: _cell_text(v) for k, v in row.items() if k in BILL_DEFAULTS}
+    except (ValueError, csv.Error, zipfile.BadZipFile, KeyError, ParseError) as e:
+        # KeyError: a zip without the workbook parts
+        raise ValueError("cannot read %s: %s" % (filename, e)) from None
+
+
+def validate_claim(bill):
+    # With travel diary legs the amount is their total, so it may be left out
+    required = [name for name in REQUIRED_COLUMNS if not (name == "amount" and bill.get("journeys"))]
+    missing = [name for name in required if not bill.get(name)]
+    if missing:
+        return "missing " + ", ".join(missing)
+    try:
+        parse_amount(resolve_bill(bill)["amount"])
+        for name in receipt_names(bill.get("receipts", "")):
+            receipt_path(name)
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+def fill_amount_words(claims):
+    """Write out the amount in words for every valid claim that left it blank,
+    converting the whole column at once."""
+    todo = [c for c in claims if not c.get("amount_words") and not validate_claim(c)]
+    for claim, words in zip(todo, convert_many(resolve_bill(c)["amount"] for c in todo)):
+        claim["amount_words"] = words
+    return claims
+
+# ---------------------------------------------------------
+# 2. PARALLEL RENDERING INTO A ZIP
+# ---------------------------------------------------------
+# Workers are started from a clean fork server (or spawned where there is
+# none) rather than forked from the caller, which may be a web server with
+# threads, locks and open sockets of its own.
+_MP_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+
+def bill_filename(number, bill):
+    name = re.sub(r"[^\w.-]+", "_", bill.get("employee_name", ""), flags=re.UNICODE).strip("_")
+    return "%04d_%s.docx" % (number, name or "bill")
+
+
+def _render_job(job):
+    # Runs in a worker process; each worker compiles the template once.
+    number, bill = job
+    error = validate_claim(bill)
+    if error:
+        return number, bill, None, error
+    try:
+        return number, bill, render_docx_bytes(bill), None
+    except Exception as e:
+        return number, bill, None, "%s: %s" % (type(e).__name__, e)
+
+
+@dataclass
+class BatchResult:
+    bills: int = 0
+    errors: list = field(default_factory=list)  # (row_number, message)
+    bytes_written: int = 0
+    peak_memory: int = 0  # bytes allocated by this process at the peak
+    violations: list = field(default_factory=list)  # (row_number, message) from the TA/DA rules
+
+
+class _CountingWriter:
+    # Minimal write-only stream for non-seekable outputs (stdout, sockets);
+    # zipfile falls back to data descriptors and never seeks back.
+    def __init__(self, raw):
+        self.raw = raw
+        self.count = 0
+
+    def write(self, data):
+        self.count += len(data)
+        return self.raw.write(data)
+
+    def flush(self):
+        self.raw.flush()
+
+
+def _write_csv(archive, name, header, rows):
+    report = io.StringIO()
+    writer = csv.writer(report)
+    writer.writerow(header)
+    writer.writerows(rows)
+    archive.writestr(name, report.getvalue())
+
+
+def generate_batch(claims, out, workers=None, progress=None, total=None, register=None, rules=None,
+                   measure_memory=False):
+    """Render every claim on a process pool and stream the bills into the ZIP
+    file object `out` (a temp file, or any writable stream). Bills are written
+    to the archive in row order as soon as they are ready and then dropped,
+    and only a bounded window of bills is in flight or waiting, so peak
+    memory stays flat whether the archive holds 10 bills or 2,000.
+
+    `progress(done, total)` is called after each bill; an exception raised
+    from it stops the run. Rows that failed are listed in the result and in
+    errors.csv inside the archive. With a BillRegister, every bill that
+    renders is recorded and its budget table filled in; rows that fail are
+    neither recorded nor charged to their budget.
+
+    `rules` checks the travel diaries of all claims against the TA/DA rules
+    first: "warn" lists violations in the result and in violations.csv,
+    "reject" also leaves those bills out as failed rows, and "apply" bills
+    every leg at no more than its entitled fare and rates.
+
+    `measure_memory` reports this process's peak allocation in the result.
+    tracemalloc is process-wide, so only the command line turns it on; a
+    server running batches on threads leaves it off.
+    """
+    workers = workers or os.cpu_count() or 1
+    window = workers * 4
+    result = BatchResult()
+    errors = result.errors
+    done = 0
+    rejected = {}
+    if rules:
+        from rules import apply_entitlements, check_claims
+
+        claims = list(claims)
+        found = check_claims(claims)
+        result.violations = [(number, message) for number in sorted(found) for message in found[number]]
+        if rules == "reject":
+            rejected = {number: "; ".join(messages) for number, messages in found.items()}
+        elif rules == "apply":
+            claims = apply_entitlements(claims)
+    jobs = enumerate(claims, start=1)
+
+    # Budget tables are running totals, so each bill is rendered with the
+    # amounts of the rows ahead of it that are still in flight counted in
+    # (`unrecorded`), and recorded in row order once it has rendered. If an
+    # earlier row failed after all, the bill's totals are off by that amount
+    # and it is rendered again with the recorded totals.
+    unrecorded = {}  # (budget head, year) -> paise in flight
+    charged = {}  # row number -> ((budget head, year), paise) it added to unrecorded
+    ready = {}  # row number -> (bill, data, error), waiting for the rows ahead of it
+    next_row = 1
+    if register is not None:
+        from register import to_paise
+
+    try:
+        start = out.tell()
+        out.seek(start)
+    except (AttributeError, OSError):
+        out = _CountingWriter(out)
+        start = None
+
+    tracing = tracemalloc.is_tracing()
+    if measure_memory:
+        if not tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+    try:
+        with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as archive, \
+                ProcessPoolExecutor(max_workers=workers, mp_context=_MP_CONTEXT) as pool:
+            pending = set()
+            exhausted = False
+            try:
+                while pending or ready or not exhausted:
+                    while not exhausted and len(pending) + len(ready) < window:
+                        job = next(jobs, None)
+                        if job is None:
+                            exhausted = True
+                            break
+                        number, bill = job
+                        if number in rejected:
+                            ready[number] = (bill, None, rejected[number])
+                            continue
+                        if register is not None and not validate_claim(bill):
+                            resolved = resolve_bill(bill)
+                            head = (resolved["budget_head"], resolved["budget_year"])
+                            bill = {**bill, **register.budget_fields(bill, unrecorded.get(head, 0))}
+                            charged[number] = (head, to_paise(resolved["amount"]))
+                            unrecorded[head] = unrecorded.get(head, 0) + charged[number][1]
+                        pending.add(pool.submit(_render_job, (number, bill)))
+
+                    while next_row in ready:
+                        bill, data, error = ready.pop(next_row)
+                        if next_row in charged:
+                            head, paise = charged.pop(next_row)
+                            unrecorded[head] -= paise
+                            if not error:
+                                recorded = register.budget_fields(bill)
+                                if any(bill.get(name) != value for name, value in recorded.items()):
+                                    _, bill, data, error = _render_job((next_row, {**bill, **recorded}))
+                            if not error:
+                                register.add_bill(bill, TEMPLATE_VERSION)
+                        if error:
+                            errors.append((next_row, error))
+                        else:
+                            # A .docx is a deflated zip already: store it as is
+                            archive.writestr(bill_filename(next_row, bill), data, zipfile.ZIP_STORED)
+                            result.bills += 1
+                        del data
+                        next_row += 1
+                        done += 1
+                        if progress:
+                            progress(done, total)
+
+                    if pending:
+                        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            number, bill, data, error = future.result()
+                            ready[number] = (bill, data, error)
+            except BaseException:
+                # e.g. the progress callback cancelling the run: drop queued bills
+                for future in pending:
+                    future.cancel()
+                raise
+
+            if errors:
+                _write_csv(archive, "errors.csv", ["row", "error"], sorted(errors))
+            if result.violations:
+                _write_csv(archive, "violations.csv", ["row", "violation"], result.violations)
+
+        if measure_memory:
+            result.peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        if measure_memory and not tracing:
+            tracemalloc.stop()
+    result.bytes_written = out.count if start is None else out.tell() - start
+    errors.sort()
+    return result
+
+# ---------------------------------------------------------
+# 3. COMMAND LINE
+# ---------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate TA bills in bulk from a CSV/XLSX of claims.")
+    parser.add_argument("claims", help="CSV or XLSX file, one claim per row")
+    parser.add_argument("-o", "--output", default="bills.zip",
+                        help="ZIP file to write, or - for stdout (default: bills.zip)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--register", metavar="PATH", help="record the bills in this bill register (SQLite)")
+    parser.add_argument("--rules", choices=["off", "warn", "reject", "apply"], default="warn",
+                        help="check travel diaries against the TA/DA rules: warn, reject the bill, "
+                             "or apply the entitled fare and rates (default: warn)")
+    args = parser.parse_args(argv)
+    register = None
+    if args.register:
+        from register import BillRegister
+
+        register = BillRegister(args.register)
+
+    rules = None if args.rules == "off" else args.rules
+
+    with open(args.claims, "rb") as f:
+        try:
+            claims = fill_amount_words(list(read_claims(f, args.claims)))
+        except ValueError as e:
+            sys.exit(str(e))
+
+    def progress(done, total):
+        print("\r%d/%d bills" % (done, total), end="", file=sys.stderr, flush=True)
+
+    if args.output == "-":
+        result = generate_batch(claims, sys.stdout.buffer, args.workers, progress, len(claims), register, rules, True)
+    else:
+        with open(args.output, "wb") as out:
+            result = generate_batch(claims, out, args.workers, progress, len(claims), register, rules, True)
+    print(file=sys.stderr)
+
+    for number, message in result.violations:
+        print("row %d: %s" % (number, message), file=sys.stderr)
+    for number, message in result.errors:
+        print("row %d: %s" % (number, message), file=sys.stderr)
+    print("%d bills written to %s, %d failed (%s bytes, peak memory %.1f MB)" % (
+        result.bills, args.output, len(result.errors),
+        format(result.bytes_written, ","), result.peak_memory / 2**20), file=sys.stderr)
+    return 1 if result.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
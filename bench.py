@@ -0,0 +1,215 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+from itertools import cycle
+
+from bill_layout import BILL_DEFAULTS, bill_layout, display_values
+
+# ---------------------------------------------------------
+# 1. HARNESS
+# ---------------------------------------------------------
+# Headless benchmarks of the hot paths (no Streamlit needed). Each benchmark
+# is timed over several repeats; a final extra run under tracemalloc gives
+# its peak Python memory. Results are written as JSON so that two releases
+# can be compared with --compare.
+def measure(fn, repeat):
+    times = []
+    size = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "best_ms": round(min(times) * 1000, 3),
+        "median_ms": round(statistics.median(times) * 1000, 3),
+        "bytes": size,
+        "peak_memory": peak,
+        "repeat": repeat,
+    }
+
+
+def _bill(i):
+    return {**BILL_DEFAULTS, "amount": str(1000 + 37 * i), "employee_name": "કર્મચારી %d" % i}
+
+# ---------------------------------------------------------
+# 2. BENCHMARKS
+# ---------------------------------------------------------
+def bench_create_docx():
+    from bill_docx import create_docx
+
+    def run():
+        create_docx(_bill(0))
+    return run
+
+
+def bench_docx_save():
+    from bill_docx import create_docx
+
+    doc = create_docx(_bill(0))
+
+    def run():
+        buffer = BytesIO()
+        doc.save(buffer)
+        return buffer.tell()
+    return run
+
+
+def bench_template_render():
+    from bill_docx import default_template
+
+    template = default_template()
+    return lambda: len(template.render(_bill(0)))
+
+
+def _diary_bill(legs):
+    leg = {"from_place": "નવસારી", "to_place": "સુરત", "mode": "એસ.ટી.", "fare": "45", "mileage_km": "30",
+           "mileage_rate": "2.5", "da_days": "1", "da_rate": "250"}
+    return {**_bill(0), "journeys": json.dumps([leg] * legs, ensure_ascii=False)}
+
+
+def bench_diary_template_render(legs):
+    from bill_docx import default_template
+
+    template = default_template()
+    bill = _diary_bill(legs)
+    return lambda: len(template.render(bill))
+
+
+def bench_diary_create_docx(legs):
+    from bill_docx import create_docx
+
+    bill = _diary_bill(legs)
+
+    def run():
+        create_docx(bill)
+    return run
+
+
+def bench_rules(claims, legs):
+    from rules import check_claims
+
+    bills = [{**_diary_bill(legs), "pay_level": str(1 + i % 18)} for i in range(claims)]
+
+    def run():
+        check_claims(bills)
+    return run
+
+
+def bench_html_preview_cold():
+    from layout import HtmlRenderer
+
+    values = display_values(_bill(0))
+    return lambda: sum(len(page) for page in HtmlRenderer(bill_layout()).render_pages(values))
+
+
+def bench_html_preview_edit():
+    from layout import HtmlRenderer
+
+    renderer = HtmlRenderer(bill_layout())
+    renderer.render_pages(display_values(_bill(0)))
+    # Alternate between two bills, as when a field is edited back and forth
+    edits = cycle([display_values(_bill(1)), display_values(_bill(0))])
+    return lambda: sum(len(page) for page in renderer.render_pages(next(edits)))
+
+
+def bench_batch(count, workers):
+    from batch import generate_batch
+
+    claims = [_bill(i) for i in range(count)]
+
+    def run():
+        with tempfile.TemporaryFile() as out:
+            return generate_batch(claims, out, workers).bytes_written
+    return run
+
+
+BENCHMARKS = {
+    "create_docx": (bench_create_docx, 20),
+    "docx_save": (bench_docx_save, 20),
+    "template_render": (bench_template_render, 200),
+    "diary_500_template": (lambda: bench_diary_template_render(500), 20),
+    "diary_500_create_docx": (lambda: bench_diary_create_docx(500), 5),
+    "rules_500x10": (lambda: bench_rules(500, 10), 5),
+    "html_preview_cold": (bench_html_preview_cold, 200),
+    "html_preview_edit": (bench_html_preview_edit, 200),
+    "batch_1": (lambda: bench_batch(1, None), 3),
+    "batch_100": (lambda: bench_batch(100, None), 3),
+    "batch_1000": (lambda: bench_batch(1000, None), 1),
+}
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmarks(names=None, quick=False):
+    unknown = sorted(set(names or ()) - set(BENCHMARKS))
+    if unknown:
+        raise ValueError("unknown benchmarks: " + ", ".join(unknown))
+    results = {}
+    for name, (setup, repeat) in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        results[name] = measure(setup(), 1 if quick else repeat)
+        print("%-20s %10.3f ms  %12s bytes  peak %8.1f KB" % (
+            name, results[name]["median_ms"], results[name]["bytes"] or "-",
+            results[name]["peak_memory"] / 1024), file=sys.stderr)
+    return {
+        "revision": _git_revision(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+
+# ---------------------------------------------------------
+# 3. COMMAND LINE
+# ---------------------------------------------------------
+def compare(old, new):
+    for name, result in new["results"].items():
+        before = old["results"].get(name)
+        if before:
+            ratio = result["median_ms"] / before["median_ms"] if before["median_ms"] else float("inf")
+            print("%-20s %10.3f -> %10.3f ms  (x%.2f)" % (name, before["median_ms"], result["median_ms"], ratio))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark bill generation, serialization and preview rendering.")
+    parser.add_argument("names", nargs="*", help="benchmarks to run (default: all): " + ", ".join(BENCHMARKS))
+    parser.add_argument("-o", "--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--quick", action="store_true", help="one repeat per benchmark")
+    args = parser.parse_args(argv)
+
+    try:
+        results = run_benchmarks(args.names, args.quick)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+import hashlib
+import os
+import re
+import time
+import zipfile
+from functools import lru_cache
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from bill_layout import bill_layout, display_values
+from fonts import FACES, embed_fonts, subset_path
+from gujarati import to_gujarati_digits
+from layout import DataTable, bound_fields, write_docx
+from receipts import receipt_names, receipt_path
+from timings import record
+
+# ---------------------------------------------------------
+# 1. HELPER FUNCTION: GENERATE WORD DOCUMENT
+# ---------------------------------------------------------
+def create_docx(bill=None):
+    return write_docx(bill_layout(), display_values(bill))
+
+# ---------------------------------------------------------
+# 2. COMPILED TEMPLATE
+# ---------------------------------------------------------
+# The bill layout is static apart from the fields in BILL_DEFAULTS. The
+# template is built once per process with a {{field}} placeholder in place of
+# each value; rendering a bill then only patches word/document.xml and appends
+# it to a pre-built zip holding every other (unchanged, already compressed) part.
+# The package is written straight into the caller's file (see write()), so a
+# bill rendered into the artifact store never exists as one bytes object.
+TEMPLATE_VERSION = "8"
+DOCUMENT_PART = "word/document.xml"
+RELS_PART = "word/_rels/document.xml.rels"
+CONTENT_TYPES_PART = "[Content_Types].xml"
+# Parts rewritten when a bill has receipts; the rest are copied as compiled
+PATCHED_PARTS = (DOCUMENT_PART, RELS_PART, CONTENT_TYPES_PART)
+ROW_FIELD = re.compile(r"\{\{(\w+)\.0\}\}")
+# Characters XML 1.0 does not allow at all (python-docx refuses them too)
+XML_INVALID = re.compile("[^\t\n\r\x20-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]")
+
+
+def template_version():
+    """TEMPLATE_VERSION plus the embedded font subsets (whose file names carry
+    a content hash), for keying cached output."""
+    fonts = [subset_path(face, "ttf") for face in FACES]
+    return ":".join([TEMPLATE_VERSION] + [os.path.basename(path) for path in fonts if path])
+
+
+def _xml_text(value):
+    """A field value escaped for a w:t element, with the control characters
+    XML forbids (stray vertical tabs from spreadsheets and the like) dropped."""
+    return escape(XML_INVALID.sub("", value))
+
+
+def _placeholder(name):
+    return "{{%s}}" % name
+
+
+def _split(xml):
+    """Split XML into literal chunks and {{field}} names, so that rendering
+    is a single join: [text, field, text, field, ..., text]."""
+    chunks = []
+    fields = []
+    rest = xml
+    while True:
+        start = rest.find("{{")
+        if start < 0:
+            break
+        end = rest.index("}}", start)
+        chunks.append(rest[:start])
+        fields.append(rest[start + 2:end])
+        rest = rest[end + 2:]
+    chunks.append(rest)
+    return chunks, fields
+
+
+class CompiledTemplate:
+    def __init__(self, docx_bytes):
+        with zipfile.ZipFile(BytesIO(docx_bytes)) as src:
+            xml = src.read(DOCUMENT_PART).decode("utf-8")
+            self.rels_xml = src.read(RELS_PART).decode("utf-8")
+            self.content_types_xml = src.read(CONTENT_TYPES_PART).decode("utf-8")
+            static = BytesIO()
+            with zipfile.ZipFile(static, "w", zipfile.ZIP_DEFLATED) as dst:
+                for info in src.infolist():
+                    if info.filename not in PATCHED_PARTS:
+                        dst.writestr(info, src.read(info.filename), zipfile.ZIP_DEFLATED)
+        self.static_zip = static.getvalue()
+        self.page_box = _page_box(xml)
+
+        # A table row holding {{source.0}}, {{source.1}}, ... is the prototype
+        # of a DataTable's body rows: it is cut out and replaced by {{@source}},
+        # which renders as one copy of the row per entry in the field.
+        self.row_templates = {}
+        while True:
+            match = ROW_FIELD.search(xml)
+            if match is None:
+                break
+            start = max(xml.rfind("<w:tr>", 0, match.start()), xml.rfind("<w:tr ", 0, match.start()))
+            end = xml.index("</w:tr>", match.end()) + len("</w:tr>")
+            chunks, fields = _split(xml[start:end])
+            columns = [int(name.rpartition(".")[2]) for name in fields]
+            self.row_templates[match.group(1)] = (chunks, columns)
+            xml = xml[:start] + _placeholder("@" + match.group(1)) + xml[end:]
+        self.chunks, self.fields = _split(xml)
+
+    def _render_rows(self, source, rows):
+        chunks, columns = self.row_templates[source]
+        for row in rows:
+            yield chunks[0]
+            for column, chunk in zip(columns, chunks[1:]):
+                yield _xml_text(row[column])
+                yield chunk
+
+    def _document_xml(self, values, appendix=""):
+        parts = [self.chunks[0]]
+        for name, chunk in zip(self.fields, self.chunks[1:]):
+            if name.startswith("@"):
+                parts.extend(self._render_rows(name[1:], values[name[1:]]))
+            else:
+                parts.append(_xml_text(values[name]))
+            parts.append(chunk)
+        if appendix:
+            # Extra pages go at the end of the body, before its section properties
+            end = parts[-1].rindex("<w:sectPr")
+            parts[-1] = parts[-1][:end] + appendix + parts[-1][end:]
+        return "".join(parts)
+
+    def write(self, out, bill=None):
+        """Write the bill's .docx into `out`, a seekable binary file opened for
+        reading and writing (a temp file, or BytesIO). The compiled parts are
+        copied in one write and each receipt scan is streamed in on its own."""
+        values = display_values(bill)
+        names = receipt_names(values["receipts"])
+        out.write(self.static_zip)
+        with zipfile.ZipFile(out, "a", zipfile.ZIP_DEFLATED) as z:
+            pictures, media = _write_receipts(z, names)
+            rels, content_types = self.rels_xml, self.content_types_xml
+            if media:
+                rels, content_types = _media_parts(rels, content_types, media)
+            z.writestr(CONTENT_TYPES_PART, content_types)
+            z.writestr(RELS_PART, rels)
+            z.writestr(DOCUMENT_PART, self._document_xml(values, _receipts_xml(pictures, self.page_box)))
+
+    def render(self, bill=None):
+        buffer = BytesIO()
+        self.write(buffer, bill)
+        return buffer.getvalue()
+
+
+def compile_template(source=None):
+    """Compile a template from a stored .docx (path or bytes) containing
+    {{field}} placeholders, or build one from create_docx() when omitted.
+    The bundled font subsets are embedded into the built template."""
+    if source is None:
+        # One placeholder per bound field, derived ones included, so that
+        # display_values() passes them all through untouched
+        blocks = [block for page in bill_layout().pages for block in page]
+        values = {name: _placeholder(name) for block in blocks for name in bound_fields(block)}
+        # DataTable bodies get a single prototype row of {{source.N}} cells
+        for block in blocks:
+            if isinstance(block, DataTable):
+                values[block.source] = [tuple(_placeholder("%s.%d" % (block.source, column))
+                                              for column in range(len(block.header[0])))]
+        start = time.perf_counter()
+        doc = create_docx(values)
+        buffer = BytesIO()
+        doc.save(buffer)
+        source = embed_fonts(buffer.getvalue())
+        record({"template_compile": (time.perf_counter() - start) * 1000},
+               {"template_docx_elements": sum(1 for _ in doc.element.iter()), "template_bytes": len(source)})
+    elif not isinstance(source, (bytes, bytearray)):
+        with open(source, "rb") as f:
+            source = f.read()
+    return CompiledTemplate(bytes(source))
+
+
+@lru_cache(maxsize=1)
+def default_template():
+    return compile_template()
+
+
+def render_docx_bytes(bill=None):
+    return default_template().render(bill)
+
+
+def render_docx_to(out, bill=None):
+    default_template().write(out, bill)
+
+# ---------------------------------------------------------
+# 3. RECEIPTS
+# ---------------------------------------------------------
+# Attached receipt scans follow the bill on pages of their own, one picture
+# per paragraph, scaled down to fit the page. Each distinct image (by sha256)
+# is stored once in word/media, uncompressed since scans are already JPEG or
+# PNG, and every receipt showing it points at the same relationship. Scans
+# are read one at a time and written out before the next, so at most one
+# image is in memory however many are attached.
+RECEIPTS_HEADING = "સાથે બીડેલ પાવતીઓ"
+RECEIPT_CAPTION = "પાવતી "
+EMU_PER_TWIP = 635
+IMAGE_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/image"
+PICTURE_XML = (
+    '<w:p><w:pPr><w:keepNext/><w:jc w:val="center"/></w:pPr><w:r><w:drawing>'
+    '<wp:inline distT="0" distB="0" distL="0" distR="0"><wp:extent cx="%(cx)d" cy="%(cy)d"/>'
+    '<wp:docPr id="%(id)d" name="Receipt %(id)d"/>'
+    '<a:graphic xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main">'
+    '<a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/picture">'
+    '<pic:pic xmlns:pic="http://schemas.openxmlformats.org/drawingml/2006/picture">'
+    '<pic:nvPicPr><pic:cNvPr id="0" name="%(name)s"/><pic:cNvPicPr/></pic:nvPicPr>'
+    '<pic:blipFill><a:blip r:embed="%(rel)s"/><a:stretch><a:fillRect/></a:stretch></pic:blipFill>'
+    '<pic:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="%(cx)d" cy="%(cy)d"/></a:xfrm>'
+    '<a:prstGeom prst="rect"><a:avLst/></a:prstGeom></pic:spPr></pic:pic>'
+    '</a:graphicData></a:graphic></wp:inline></w:drawing></w:r></w:p>'
+)
+
+
+def _twips(xml, element, name):
+    match = re.search(r"<w:%s\b[^>]*\bw:%s=\"(\d+)\"" % (element, name), xml)
+    return int(match.group(1)) if match else 0
+
+
+def _page_box(xml):
+    """Width and height (EMU) inside the margins of the document's last
+    section, with room left for a picture's caption."""
+    sect = xml[xml.rindex("<w:sectPr"):]
+    width = _twips(sect, "pgSz", "w") - _twips(sect, "pgMar", "left") - _twips(sect, "pgMar", "right")
+    height = _twips(sect, "pgSz", "h") - _twips(sect, "pgMar", "top") - _twips(sect, "pgMar", "bottom")
+    return width * EMU_PER_TWIP, int(height * 0.9) * EMU_PER_TWIP
+
+
+def _write_receipts(z, names):
+    """Add the receipt images to the open package `z`. Returns one
+    (relationship id, name, width, height) per receipt, in order, and the
+    media parts written as (relationship id, part name, content type)."""
+    from docx.image.image import Image
+
+    pictures = []
+    media = []
+    by_digest = {}
+    by_name = {}
+    for name in names:
+        if name not in by_name:
+            with open(receipt_path(name), "rb") as f:
+                blob = f.read()
+            digest = hashlib.sha256(blob).hexdigest()
+            if digest not in by_digest:
+                image = Image.from_blob(blob)
+                rel = "rIdReceipt%d" % (len(media) + 1)
+                part = "word/media/receipt-%s.%s" % (digest[:16], image.ext)
+                z.writestr(part, blob, zipfile.ZIP_STORED)
+                media.append((rel, part, image.content_type))
+                by_digest[digest] = (rel, image.width, image.height)
+            by_name[name] = by_digest[digest]
+            del blob
+        rel, width, height = by_name[name]
+        pictures.append((rel, name, width, height))
+    return pictures, media
+
+
+def _media_parts(rels, content_types, media):
+    """The relationships and content types parts with the media added."""
+    rels = rels.replace("</Relationships>", "".join(
+        '<Relationship Id="%s" Type="%s" Target="%s"/>' % (rel, IMAGE_REL, part[len("word/"):])
+        for rel, part, _ in media) + "</Relationships>")
+    defaults = {}
+    for _, part, content_type in media:
+        ext = part.rpartition(".")[2]
+        if 'Extension="%s"' % ext not in content_types:
+            defaults[ext] = content_type
+    content_types = content_types.replace("</Types>", "".join(
+        '<Default Extension="%s" ContentType="%s"/>' % item for item in defaults.items()) + "</Types>")
+    return rels, content_types
+
+
+def _receipts_xml(pictures, page_box):
+    if not pictures:
+        return ""
+    box_width, box_height = page_box
+    parts = [
+        '<w:p><w:r><w:br w:type="page"/></w:r></w:p>',
+        '<w:p><w:pPr><w:jc w:val="center"/></w:pPr><w:r><w:rPr><w:b/><w:bCs/></w:rPr>'
+        '<w:t>%s</w:t></w:r></w:p>' % RECEIPTS_HEADING,
+    ]
+    for number, (rel, name, width, height) in enumerate(pictures, start=1):
+        scale = min(1.0, box_width / width, box_height / height) if width and height else 1.0
+        parts.append(PICTURE_XML % {"cx": int(width * scale), "cy": int(height * scale), "id": number,
+                                    "name": escape(name, {'"': "&quot;"}), "rel": rel})
+        parts.append('<w:p><w:pPr><w:jc w:val="center"/></w:pPr><w:r><w:t>%s%s</w:t></w:r></w:p>'
+                     % (RECEIPT_CAPTION, to_gujarati_digits(number)))
+    return "".join(parts)
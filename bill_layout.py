@@ -0,0 +1,253 @@
+from functools import lru_cache
+
+import diary
+from fonts import FAMILY
+from gujarati import PAISE, amount_in_words, financial_year, parse_amount, to_gujarati_digits
+from layout import Cell, DataTable, Layout, NumberedList, Run, Table, p
+
+# ---------------------------------------------------------
+# 0. BILL INPUT VALUES
+# ---------------------------------------------------------
+BILL_DEFAULTS = {
+    "amount": "12161",
+    "amount_words": "",  # filled in from the amount when left empty
+    "month": "ઓક્ટોમ્બર - " + to_gujarati_digits(2025),
+    "budget_year": financial_year(2024),
+    "employee_name": "સચિન આર. પટેલ",
+    "designation": "સહ પ્રાધ્યાપક",
+    "pay_level": "",  # for the TA/DA rule checks (rules.py); not printed
+    "department": "કિટકશાત્ર વિભાગ",
+    "voucher_no": "",
+    "voucher_date": "",
+    "cheque_no": "",
+    "cheque_date": "",
+    "journeys": "",  # travel diary legs as JSON (see diary.py); sets the amount
+    "receipts": "",  # attached receipt scans, one stored name per line (see receipts.py)
+    "budget_head": "",
+    "scheme_name": "",
+    "unit_code": "",
+    # Budget table, filled in from the bill register when it knows the head
+    "budget_sanctioned": "",
+    "budget_spent": "",
+    "budget_balance": "",
+}
+
+# Fields printed as a blank line when left empty
+BLANK = "____________________"
+BLANK_WHEN_EMPTY = ("budget_head", "scheme_name", "unit_code", "voucher_no", "voucher_date",
+                    "cheque_no", "cheque_date")
+
+# Budget table amounts, each shown split over the rupee and paise columns
+# as <name>_rs and <name>_ps
+BUDGET_AMOUNTS = ("budget_sanctioned", "budget_spent", "budget_balance")
+
+
+def split_rupees(amount):
+    """'12161.5' -> ('12161', '50'), '-0.25' -> ('-0', '25') for an
+    overspent balance; blank stays blank."""
+    if not amount:
+        return "", ""
+    sign = "-" if amount.startswith("-") else ""
+    rupees, paise = parse_amount(amount[len(sign):])
+    return sign + str(rupees), "%02d" % paise
+
+
+def _claim(values, amount):
+    # A bill with travel diary legs claims their total, whatever was typed
+    if amount and amount != values["amount"]:
+        values["amount"] = amount
+        values["amount_words"] = ""
+    return values
+
+
+def resolve_bill(bill=None):
+    """Merge `bill` over the defaults, taking the amount from its travel
+    diary if it has one."""
+    values = {**BILL_DEFAULTS, **(bill or {})}
+    return _claim(values, diary.journeys_amount(values["journeys"]))
+
+
+def display_values(bill=None):
+    """Merge `bill` over the defaults, fill in derived fields and replace
+    empty optional fields with blanks. Derived fields already present in
+    `bill` are kept as they are."""
+    values = {**BILL_DEFAULTS, **(bill or {})}
+    if "diary_rows" not in values:
+        values.update(diary.diary_values(values["journeys"]))
+        _claim(values, values["diary_total"])
+    if not values["amount_words"]:
+        values["amount_words"] = amount_in_words(values["amount"])
+    # The boxed amount reads "રૂપિયા ... પૈસા": its "પૈસા" only closes words
+    # that don't already end with the paise
+    if "paise_label" not in values:
+        values["paise_label"] = "" if values["amount_words"].endswith(PAISE) else " " + PAISE
+    for name in BUDGET_AMOUNTS:
+        if name + "_rs" not in values:
+            values[name + "_rs"], values[name + "_ps"] = split_rupees(values[name])
+    for name in BLANK_WHEN_EMPTY:
+        values[name] = values[name] or BLANK
+    return values
+
+
+def cell(*paragraphs):
+    return Cell(list(paragraphs))
+
+# ---------------------------------------------------------
+# 1. BILL LAYOUT (shared by the DOCX and the HTML preview)
+# ---------------------------------------------------------
+@lru_cache(maxsize=1)
+def bill_layout():
+    # --- PAGE 1 ---
+    page1 = [
+        # Top Right: Hisabi Patrak
+        p("હિસાબી પત્રક નંબર ____________", align="right"),
+
+        # Center Header
+        p(Run("નવસારી કૃષિ વિશ્વવિધાલય\n", bold=True, size=16),
+          Run("મુસાફરી ભથ્થા બીલ", bold=True, size=14), align="center"),
+
+        # Info Table (Bill No vs Voucher No)
+        Table([[
+            cell(p(Run("બીલ નંબર :\nતારીખ       :", bold=True))),
+            cell(p("વાઉચર નં. {voucher_no}\n",
+                   "તારીખ {voucher_date}\n",
+                   "યુનિટ નંબર : {unit_code}\n",
+                   "કોડ નંબર : ____________________", align="right")),
+        ]], widths=[80, 95], autofit=False),
+
+        p(),  # Spacer
+
+        # Main Body Text
+        p(Run("આચાર્ય અને ડીનશ્રી, નં. મ. કૃષિ મહાવિદ્યાલય, નકૃયું, નવસારી ની કચેરીનું માહે: {month} નું",
+              bold=True), align="center"),
+        p(Run("મુસાફરી ભથ્થા બિલ", bold=True, underline=True, size=14), align="center"),
+        p("યુનિટ/સબયુનિટ : આચાર્ય અને ડીનશ્રી, ન. મ. કૃષિ મહાવિદ્યાલય, નકૃયું, નવસારી"),
+        p("ખર્ચ માટેનું બજેટ સદર :- {budget_head}", align="center"),
+        p("યોજનાનું નામ :- {scheme_name}", align="center"),
+
+        p(),  # Spacer
+
+        # Claim Amount
+        p("આથી રૂ।. ", Run(" {amount} ", bold=True, underline=True),
+          " નો દાવો મંજુર કરી ગ્રાહય રાખવામાં આવે છે."),
+
+        # Boxed Amount Area
+        Table([[cell(p(
+            "આ બીલમાં જણાવેલ રૂા  ", Run("{amount}", bold=True),
+            "  ( અંકે રૂપિયા ", Run("{amount_words}", bold=True),
+            "{paise_label} )\n\n",
+            "મંજુર કરવામાં આવે છે. અને તે રોકડા / ચેક નં. {cheque_no} તા. {cheque_date} થી ચુકવવામાં આવે છે.",
+        ))]], grid=True),
+
+        p(),  # Spacer
+
+        # Signatures
+        Table([[
+            cell(p("સ્થળ :    નવસારી\nતારીખ :")),
+            cell(p("____________________\n", "બીલ મંજુર કરનાર અધિકારીની\nસહી અને હોદ્દો", align="center")),
+        ]]),
+
+        p(),  # Spacer
+
+        # Budget Table
+        Table([
+            [cell(p()), cell(p("રૂ.")), cell(p("પૈસા"))],
+            [cell(p("(૧) સને {budget_year} માટે બજેટમાં મંજુર થયેલ રકમ")),
+             cell(p("{budget_sanctioned_rs}")), cell(p("{budget_sanctioned_ps}"))],
+            [cell(p("(૨) આ બીલ સાથે થયેલ કુલ ખર્ચ")),
+             cell(p("{budget_spent_rs}")), cell(p("{budget_spent_ps}"))],
+            [cell(p("(૩) ખર્ચ માટે બાકી રહેતી રકમ")),
+             cell(p("{budget_balance_rs}")), cell(p("{budget_balance_ps}"))],
+        ], grid=True),
+
+        p(),  # Spacer
+
+        # Bottom Signature
+        p("રૂા ( {amount} ) અંકે રૂપિયા : {amount_words} મંજુર કર્યા"),
+        p(Run("નિયંત્રણ અધિકારીની સહી___________", bold=True), align="right"),
+    ]
+
+    # --- PAGE 2 ---
+    page2 = [
+        p(Run("નોંધ :-", bold=True)),
+        NumberedList([
+            p("કોલમ નં. ૭ માં મુસાફરી પ્રકાર રેલ્વે/એસ.ટી./હવાઈ/સ્ટીમર/ભાડાનું યુનિવર્સિટી કે સરકારી કે પોતાનું વાહન ઈત્યાદી મારફત કરેલ મુસાફરીની સ્પષ્ટ નોંધ આપવી."),
+            p("કોલમ નં. ૧૧ થી ૧૩ માઈલેજ મેળવતા અધિકારીઓ કે સભ્યોએ ભરવી."),
+            p("કોલમ નં. ૧૬ માં માત્ર દૈનિક ભથ્થાની રકમ લેવી જેથી કોલમ (૧૪ X ૧૫= ૧૬) થઈ રહેવું જોઈએ."),
+            p("જયારે મુસાફરી ભથ્થા બીલમાં શરૂઆતમાં મુસાફરીને બદલે 'હોલ્ટ' દર્શાવવામાં આવેલ હોય તેવા કિસ્સામાં 'હોલ્ટ' ની શરૂઆત થયાની તારીખ કો.નં. ૧૯ માં દર્શાવવી."),
+        ]),
+
+        p(),
+        p(Run("યુનિવર્સિટી કર્મચારીએ આપવાનું પ્રમાણપત્ર", bold=True)),
+        NumberedList([
+            p("આથી પ્રમાણપત્ર આપવામાં આવે છે કે, આ બીલમાં આકારેલ રકમ બીજા કોઈ બીલમાં આકારેલ નથી."),
+            p("આથી પ્રમાણીત કરવામાં આવે છે કે સદર મુસાફરી ભથ્થા બીલમાં દર્શાવેલ હકીકત સાચી છે... (નિયમોના ૬૫-૧ ના અનુમાનોને આધારે સાચો છે)."),
+            p("આથી પ્રમાણપત્ર આપવામાં આવે છે કે બીલમાં દર્શાવેલ પ્રવાસ માટે મેં આ અગાઉ પેશગી લીધેલ નથી / ",
+              Run("મે પેશગી લીધેલ છે...", strike=True)),
+            p("આ બીલમાં જણાવેલ યુનિવર્સિટી સિવાયની અન્ય સંસ્થાની ભ્રમગીરીના પ્રવાસ માટે... (નાણાં મળશે તો જમા કરાવવામાં આવશે)."),
+            p("આથી પ્રમાણપત્ર આપવામાં આવે છે કે, પ્રવાસ ડાયરીમાં દર્શાવવામાં આવેલ સ્થળ, તારીખ, સમય, કિલોમીટર કચેરીના વાહન લોગબુક મુજબ આકારવામાં આવેલ છે."),
+        ]),
+
+        # Employee Signature
+        p(Run("({employee_name})\n", bold=True), "{designation}\nકર્મચારીની સહી નામ અને હોદ્દો", align="right"),
+
+        p("_" * 50),  # Horizontal Line simulation
+
+        # Officer Cert
+        p(Run("યુનિવર્સિટી અધિકારીઓ અને અન્ય સભ્યોએ આપવાનું પ્રમાણપત્ર", bold=True)),
+        p("આથી પ્રમાણિત કરવામાં આવે છે કે સદર બીલમાં કરેલ મુસાફરી ભથ્થાનો દાવો આ અંગેના નિયમોની જોગવાઈઓના આધારે ખરો અને યોગ્ય છે."),
+
+        # Officer Signature
+        p("_______________________\n",
+          Run("પ્રાધ્યાપક અને વડા\n{department}\nનં. મ. કૃષિ મહાવિદ્યાલય\nનકૃયું, નવસારી", bold=True),
+          align="right"),
+
+        p(),
+
+        # --- FINAL SPLIT TABLE (CALCULATION & RECEIPT) ---
+        p(Run("કર્મચારી / અધિકારી / સભ્યશ્રીએ નીચેની વિગત ભરવી.", bold=True)),
+        Table([[
+            # Left Cell (Calculation)
+            cell(p("બીલની કુલ રકમ\t= {amount}\n",
+                   "બાદ બીલની પેશગીની રકમ\t=\n",
+                   "ચૂકવવા પાત્ર ચોખ્ખી રકમ\t= {amount}\n\n",
+                   "પેશગીના નાણાં મળ્યાની તા.\n",
+                   "પેશગી કયા ઝોન /યુનિટમાંથી\t નીલ\nઉપાડવામાં આવી.\n\n",
+                   "પેશગી ઉપાડવાના વાઉચર નંબર ______ તારીખ _____")),
+            # Right Cell (Receipt)
+            cell(p(Run("બીલની રકમ રૂ. {amount}\n", bold=True),
+                   Run("અંકે રૂપિયા {amount_words}\n", bold=True),
+                   "મને મળ્યા છે.\n\n",
+                   "સ્થળ : નવસારી\n",
+                   "તારીખ :\n\n\n",
+                   Run("                                        ({employee_name})\n", bold=True),
+                   "                                        {designation}")),
+        ]], widths=[90, 90], grid=True),
+    ]
+
+    # --- PAGE 3: TRAVEL DIARY ---
+    def heading(text):
+        return cell(p(Run(text, bold=True, size=7), align="center"))
+
+    def amount(name):
+        return cell(p(Run("{%s}" % name, bold=True, size=7)))
+
+    totals = [cell(p(Run("કુલ", bold=True, size=7)))] + [cell(p()) for _ in diary.COLUMNS[1:]]
+    for column, name in ((9, "diary_fare"), (13, "diary_mileage"), (16, "diary_da"),
+                         (17, "diary_other"), (18, "diary_total")):
+        totals[column - 1] = amount(name)
+
+    page3 = [
+        p(Run("મુસાફરી ડાયરી", bold=True, underline=True, size=14), align="center"),
+        p("કર્મચારીનું નામ : {employee_name}\tહોદ્દો : {designation}\tમાહે : {month}"),
+        DataTable(
+            header=[[heading(text) for text in diary.COLUMNS],
+                    [heading(number) for number in diary.COLUMN_NUMBERS]],
+            source="diary_rows",
+            footer=[totals],
+            widths=list(diary.WIDTHS),
+            size=7,
+        ),
+    ]
+
+    return Layout(pages=[page1, page2, page3], font_name=FAMILY)
@@ -0,0 +1,146 @@
+import json
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from gujarati import ASCII_DIGITS, format_paise, parse_amount, to_gujarati_digits
+
+# ---------------------------------------------------------
+# 1. JOURNEY LEGS
+# ---------------------------------------------------------
+# The travel diary is one row per journey leg. A bill carries its legs in the
+# "journeys" field as a JSON list of objects with the keys in LEG_FIELDS (all
+# optional strings). The computed columns follow the notes on page 2:
+#   13 = 11 x 12   mileage km x rate per km
+#   16 = 14 x 15   daily allowance days x daily rate
+#   18 = 9 + 13 + 16 + 17
+# and column 18's total becomes the bill's claim amount.
+#
+# LEG_COLUMNS maps each entered field to the diary column it is printed in.
+LEG_COLUMNS = {
+    "from_place": 2, "depart_date": 3, "depart_time": 4, "to_place": 5, "arrival": 6, "mode": 7,
+    "travel_class": 8, "fare": 9, "km": 10, "mileage_km": 11, "mileage_rate": 12, "da_days": 14,
+    "da_rate": 15, "other": 17, "remarks": 19,
+}
+LEG_FIELDS = tuple(LEG_COLUMNS)
+
+# Column headings (the numbers the notes on page 2 refer to)
+COLUMNS = (
+    "ક્રમ", "ક્યાંથી", "તારીખ", "સમય", "ક્યાં સુધી", "આગમન તારીખ / સમય", "મુસાફરીનો પ્રકાર",
+    "વર્ગ", "ભાડું રૂ.", "અંતર કિ.મી.", "માઈલેજ કિ.મી.", "દર રૂ. / કિ.મી.", "માઈલેજ રકમ રૂ.",
+    "દિવસ", "દૈનિક ભથ્થાનો દર", "દૈનિક ભથ્થું રૂ.", "અન્ય ખર્ચ રૂ.", "કુલ રૂ.", "શેરો",
+)
+COLUMN_NUMBERS = tuple(to_gujarati_digits(n) for n in range(1, len(COLUMNS) + 1))
+WIDTHS = (6, 12, 10, 8, 12, 12, 10, 7, 9, 7, 8, 7, 9, 6, 8, 9, 8, 10, 13)  # mm
+
+# Rows left empty for filling in by hand when a bill has no legs
+BLANK_ROWS = 5
+
+TOTALS = ("fare", "mileage", "da", "other", "total")
+
+# Largest km or day count a leg may claim; keeps column arithmetic well within
+# the decimal context's 28 digits
+MAX_QUANTITY = Decimal(10**6)
+
+
+def parse_journeys(journeys):
+    """The legs in a bill's "journeys" field ("" for none)."""
+    if not journeys:
+        return []
+    try:
+        legs = json.loads(journeys)
+    except json.JSONDecodeError as e:
+        raise ValueError("journeys is not valid JSON: %s" % e) from None
+    if not isinstance(legs, list) or not all(isinstance(leg, dict) for leg in legs):
+        raise ValueError("journeys must be a list of journey legs")
+    return legs
+
+
+def _quantity(leg, name):
+    text = str(leg.get(name) or "0").translate(ASCII_DIGITS).strip()
+    try:
+        value = Decimal(text)
+    except InvalidOperation:
+        raise ValueError("%s is not a number: %r" % (name, leg.get(name))) from None
+    if not value.is_finite():
+        raise ValueError("%s is not a number: %r" % (name, leg.get(name)))
+    if value < 0:
+        raise ValueError("%s must not be negative: %r" % (name, leg.get(name)))
+    if value > MAX_QUANTITY:
+        raise ValueError("%s is too large: %r" % (name, leg.get(name)))
+    return value
+
+
+def _paise(leg, name):
+    rupees, paise = parse_amount(leg.get(name) or "0")
+    return rupees * 100 + paise
+
+
+def leg_amounts(leg):
+    """Columns 9, 13, 16, 17 and 18 of a leg, in paise."""
+    mileage = _quantity(leg, "mileage_km") * _paise(leg, "mileage_rate")
+    da = _quantity(leg, "da_days") * _paise(leg, "da_rate")
+    try:
+        amounts = {
+            "fare": _paise(leg, "fare"),
+            "mileage": int(mileage.quantize(Decimal(1), ROUND_HALF_UP)),
+            "da": int(da.quantize(Decimal(1), ROUND_HALF_UP)),
+            "other": _paise(leg, "other"),
+        }
+    except InvalidOperation:
+        # A rate so large that quantity x rate outgrows the decimal context
+        raise ValueError("leg amount is too large") from None
+    amounts["total"] = sum(amounts.values())
+    return amounts
+
+# ---------------------------------------------------------
+# 2. DIARY TABLE
+# ---------------------------------------------------------
+def _amount_cell(paise):
+    return format_paise(paise) if paise else ""
+
+
+def diary_rows(legs, totals):
+    """Yield the table's rows (tuples of cell strings) one leg at a time,
+    adding each leg's amounts into `totals` (a dict of paise) on the way."""
+    for number, leg in enumerate(legs, start=1):
+        try:
+            amounts = leg_amounts(leg)
+        except ValueError as e:
+            raise ValueError("journey %d: %s" % (number, e)) from None
+        for name in TOTALS:
+            totals[name] += amounts[name]
+        text = {name: str(leg.get(name) or "") for name in LEG_FIELDS}
+        yield (
+            str(number), text["from_place"], text["depart_date"], text["depart_time"],
+            text["to_place"], text["arrival"], text["mode"], text["travel_class"],
+            _amount_cell(amounts["fare"]), text["km"], text["mileage_km"], text["mileage_rate"],
+            _amount_cell(amounts["mileage"]), text["da_days"], text["da_rate"],
+            _amount_cell(amounts["da"]), _amount_cell(amounts["other"]),
+            _amount_cell(amounts["total"]), text["remarks"],
+        )
+
+
+def diary_values(journeys):
+    """The diary_* fields the layout binds: the body rows and the column
+    totals. The rows are produced in a single pass over the legs."""
+    totals = dict.fromkeys(TOTALS, 0)
+    legs = parse_journeys(journeys)
+    if legs:
+        rows = tuple(diary_rows(legs, totals))
+    else:
+        rows = (("",) * len(COLUMNS),) * BLANK_ROWS
+    values = {"diary_rows": rows, "diary_legs": len(legs)}
+    for name in TOTALS:
+        values["diary_" + name] = format_paise(totals[name]) if legs else ""
+    return values
+
+
+def journeys_amount(journeys):
+    """The claim amount (column 18's total) of a bill's legs, or None if it
+    has none."""
+    legs = parse_journeys(journeys)
+    if not legs:
+        return None
+    totals = dict.fromkeys(TOTALS, 0)
+    for _ in diary_rows(legs, totals):
+        pass
+    return format_paise(totals["total"])
@@ -0,0 +1,233 @@
+import hashlib
+import os
+import re
+import sys
+import uuid
+import zipfile
+from functools import lru_cache
+from io import BytesIO
+
+# ---------------------------------------------------------
+# 1. BUNDLED FONT
+# ---------------------------------------------------------
+# The preview and the .docx both use Noto Sans Gujarati 2.106 (Regular and
+# Bold, SIL Open Font License, see fonts/OFL.txt). The full fonts live in
+# fonts/; `python fonts.py` subsets them to the glyphs a bill can contain and
+# writes the results to static/fonts/:
+#   *.woff2  served to the browser through Streamlit static serving
+#   *.ttf    embedded into every generated .docx (and so into its PDF)
+# Subset file names carry a content hash, so a changed font is a new URL and
+# the files can be cached for good (see section 4).
+FAMILY = "Noto Sans Gujarati"
+FILE_PREFIX = FAMILY.replace(" ", "")
+FACES = {"Regular": 400, "Bold": 700}
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.join(ROOT, "fonts")
+STATIC_DIR = os.path.join(ROOT, "static", "fonts")
+STATIC_URL = "app/static/fonts"
+
+# The Gujarati letters, signs and digits in current use (not the Sindhi and
+# Kutchi additions, vocalic L or the OM and abbreviation signs: each letter
+# drags its conjunct ligatures into the subset), Basic Latin for amounts and
+# punctuation, the danda and the rupee sign.
+GUJARATI_UNUSED = {0x0A8C, 0x0AD0, 0x0AE1, 0x0AE2, 0x0AE3, 0x0AF0}
+SUBSET_UNICODES = (
+    [c for c in range(0x0A81, 0x0AF2) if c not in GUJARATI_UNUSED] + list(range(0x20, 0x7F))
+    + [0xA0, 0x0964, 0x0965, 0x20B9, 0x200C, 0x200D, 0x25CC]
+)
+# Copyright, family, style, unique id, full name, version, PostScript name,
+# license and license URL: the naming records the OFL asks to keep
+NAME_IDS = [0, 1, 2, 3, 4, 5, 6, 13, 14]
+
+
+def _source_path(face):
+    """The full font for a face, or None if it isn't bundled."""
+    # Only TrueType sources: Word embeds nothing else
+    path = os.path.join(SOURCE_DIR, "%s-%s.ttf" % (FILE_PREFIX, face))
+    return path if os.path.exists(path) else None
+
+
+def subset_font(data, flavor=None):
+    """Subset a font to SUBSET_UNICODES, keeping the shaping features that
+    Gujarati conjuncts need. `flavor` is None for TTF or "woff2"."""
+    from fontTools import subset
+
+    options = subset.Options()
+    # The default features already include the Indic shaping ones (akhn,
+    # half, rphf, pres, abvs, blwm, ...); "*" would add alternates no
+    # shaper applies to running text
+    options.flavor = flavor
+    options.name_IDs = NAME_IDS
+    options.hinting = False
+    font = subset.load_font(BytesIO(data), options)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=SUBSET_UNICODES)
+    subsetter.subset(font)
+    out = BytesIO()
+    subset.save_font(font, out, options)
+    return out.getvalue()
+
+
+def build_subsets():
+    """Regenerate static/fonts/ from the full fonts in fonts/."""
+    faces = {face: _source_path(face) for face in FACES}
+    if not any(faces.values()):
+        raise FileNotFoundError("no %s font in %s" % (FAMILY, SOURCE_DIR))
+    os.makedirs(STATIC_DIR, exist_ok=True)
+    for name in os.listdir(STATIC_DIR):
+        os.remove(os.path.join(STATIC_DIR, name))
+    written = []
+    for face, source in faces.items():
+        if source is None:
+            continue
+        with open(source, "rb") as f:
+            data = f.read()
+        for flavor, ext in ((None, "ttf"), ("woff2", "woff2")):
+            out = subset_font(data, flavor)
+            digest = hashlib.sha256(out).hexdigest()[:10]
+            path = os.path.join(STATIC_DIR, "%s-%s.%s.%s" % (FILE_PREFIX, face, digest, ext))
+            with open(path, "wb") as f:
+                f.write(out)
+            written.append((path, len(data), len(out)))
+    return written
+
+
+def subset_path(face, ext):
+    """Path of the built subset for a face, or None if it hasn't been built."""
+    prefix = "%s-%s." % (FILE_PREFIX, face)
+    if os.path.isdir(STATIC_DIR):
+        for name in os.listdir(STATIC_DIR):
+            if name.startswith(prefix) and name.endswith("." + ext):
+                return os.path.join(STATIC_DIR, name)
+    return None
+
+# ---------------------------------------------------------
+# 2. PREVIEW (@font-face)
+# ---------------------------------------------------------
+@lru_cache(maxsize=1)
+def font_face_css():
+    """@font-face rules for the preview. An installed copy of the font is
+    preferred; otherwise the bundled subset is fetched from this server."""
+    rules = []
+    for face, weight in FACES.items():
+        full_name = FAMILY if face == "Regular" else "%s %s" % (FAMILY, face)
+        src = ["local('%s')" % full_name, "local('%s-%s')" % (FILE_PREFIX, face)]
+        path = subset_path(face, "woff2")
+        if path:
+            src.append("url('%s/%s') format('woff2')" % (STATIC_URL, os.path.basename(path)))
+        rules.append(
+            "@font-face { font-family: '%s'; font-weight: %d; font-display: swap; src: %s; }"
+            % (FAMILY, weight, ", ".join(src)))
+    return "\n".join(rules)
+
+# ---------------------------------------------------------
+# 3. DOCX EMBEDDING
+# ---------------------------------------------------------
+# Word stores embedded fonts as "obfuscated" TrueType parts (ECMA-376 Part 1,
+# 17.8.1): the first 32 bytes are XORed with a key derived from a GUID that is
+# recorded next to the font in fontTable.xml.
+FONT_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/font"
+ODTTF_TYPE = "application/vnd.openxmlformats-officedocument.obfuscatedFont"
+
+
+def obfuscate_font(data, font_key):
+    key = bytes.fromhex(font_key.strip("{}").replace("-", ""))[::-1]
+    head = bytes(b ^ key[i % 16] for i, b in enumerate(data[:32]))
+    return head + data[32:]
+
+
+@lru_cache(maxsize=1)
+def docx_font_faces():
+    """{face: ttf bytes} for the built subsets, empty if they haven't been built."""
+    faces = {}
+    for face in FACES:
+        path = subset_path(face, "ttf")
+        if path:
+            with open(path, "rb") as f:
+                faces[face] = f.read()
+    return faces
+
+
+def embed_fonts(docx_bytes, faces=None, family=FAMILY):
+    """Return a copy of a .docx package with `faces` ({"Regular": ttf, ...})
+    embedded under the font name `family`."""
+    faces = docx_font_faces() if faces is None else faces
+    if not faces:
+        return docx_bytes
+
+    font_xml = ['<w:font w:name="%s"><w:charset w:val="00"/><w:family w:val="swiss"/>'
+                '<w:pitch w:val="variable"/>' % family]
+    rels = []
+    parts = {}
+    for i, (face, data) in enumerate(faces.items(), start=1):
+        font_key = "{%s}" % str(uuid.uuid4()).upper()
+        rel_id = "rIdFont%d" % i
+        partname = "fonts/font%d.odttf" % i
+        parts["word/" + partname] = obfuscate_font(data, font_key)
+        rels.append('<Relationship Id="%s" Type="%s" Target="%s"/>' % (rel_id, FONT_REL, partname))
+        font_xml.append('<w:embed%s r:id="%s" w:fontKey="%s"/>' % (face, rel_id, font_key))
+    font_xml.append("</w:font>")
+
+    out = BytesIO()
+    with zipfile.ZipFile(BytesIO(docx_bytes)) as src, \
+            zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as dst:
+        for info in src.infolist():
+            data = src.read(info.filename)
+            if info.filename == "word/fontTable.xml":
+                data = data.replace(b"</w:fonts>", "".join(font_xml).encode("utf-8") + b"</w:fonts>")
+            elif info.filename == "word/settings.xml":
+                # embedTrueTypeFonts must directly follow the zoom setting
+                data = re.sub(rb"(<w:zoom[^>]*/>)", rb"\1<w:embedTrueTypeFonts/><w:saveSubsetFonts/>",
+                              data, count=1)
+            elif info.filename == "[Content_Types].xml":
+                data = data.replace(
+                    b"<Default ", b'<Default Extension="odttf" ContentType="%s"/><Default ' % ODTTF_TYPE.encode(),
+                    1)
+            dst.writestr(info, data)
+        dst.writestr(
+            "word/_rels/fontTable.xml.rels",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + "".join(rels) + "</Relationships>")
+        for name, data in parts.items():
+            dst.writestr(name, data)
+    return out.getvalue()
+
+
+# ---------------------------------------------------------
+# 4. CACHE HEADERS
+# ---------------------------------------------------------
+# Streamlit's static route sends no Cache-Control, so browsers revalidate the
+# fonts on every page load. The subset names carry a content hash, so they
+# can be cached for a year and never revalidated. serve.py runs app.py as an
+# st.App with this middleware; `streamlit run serve.py` starts it.
+CACHE_CONTROL = b"public, max-age=31536000, immutable"
+
+
+class ImmutableFontsMiddleware:
+    """ASGI middleware adding a long Cache-Control to the font subsets."""
+
+    def __init__(self, app, prefix="/" + STATIC_URL + "/"):
+        self.app = app
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefix):
+            return await self.app(scope, receive, send)
+
+        async def send_cached(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                headers = [(k, v) for k, v in message.get("headers", []) if k.lower() != b"cache-control"]
+                message = dict(message, headers=headers + [(b"cache-control", CACHE_CONTROL)])
+            await send(message)
+
+        await self.app(scope, receive, send_cached)
+
+if __name__ == "__main__":
+    try:
+        results = build_subsets()
+    except FileNotFoundError as e:
+        sys.exit("%s\nPlace %s-Regular.ttf and -Bold.ttf in %s" % (e, FILE_PREFIX, SOURCE_DIR))
+    for path, before, after in results:
+        print("%s: %d KB -> %d KB" % (os.path.relpath(path, ROOT), before // 1024, after // 1024))
@@ -0,0 +1,138 @@
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+
+# ---------------------------------------------------------
+# 1. LOOKUP TABLES
+# ---------------------------------------------------------
+# Gujarati number names below 100 are irregular, so they are listed in full.
+WORDS_0_99 = (
+    "શૂન્ય", "એક", "બે", "ત્રણ", "ચાર", "પાંચ", "છ", "સાત", "આઠ", "નવ",
+    "દસ", "અગિયાર", "બાર", "તેર", "ચૌદ", "પંદર", "સોળ", "સત્તર", "અઢાર", "ઓગણીસ",
+    "વીસ", "એકવીસ", "બાવીસ", "ત્રેવીસ", "ચોવીસ", "પચ્ચીસ", "છવ્વીસ", "સત્તાવીસ", "અઠ્ઠાવીસ", "ઓગણત્રીસ",
+    "ત્રીસ", "એકત્રીસ", "બત્રીસ", "તેત્રીસ", "ચોત્રીસ", "પાંત્રીસ", "છત્રીસ", "સાડત્રીસ", "આડત્રીસ", "ઓગણચાલીસ",
+    "ચાલીસ", "એકતાલીસ", "બેતાલીસ", "તેતાલીસ", "ચુંમાલીસ", "પિસ્તાલીસ", "છેતાલીસ", "સુડતાલીસ", "અડતાલીસ", "ઓગણપચાસ",
+    "પચાસ", "એકાવન", "બાવન", "ત્રેપન", "ચોપન", "પંચાવન", "છપ્પન", "સત્તાવન", "અઠ્ઠાવન", "ઓગણસાઠ",
+    "સાઠ", "એકસઠ", "બાસઠ", "ત્રેસઠ", "ચોસઠ", "પાંસઠ", "છાસઠ", "સડસઠ", "અડસઠ", "ઓગણસિત્તેર",
+    "સિત્તેર", "એકોતેર", "બોતેર", "તોતેર", "ચુમોતેર", "પંચોતેર", "છોતેર", "સિત્યોતેર", "ઇઠ્યોતેર", "ઓગણાએંસી",
+    "એંસી", "એક્યાસી", "બ્યાસી", "ત્યાસી", "ચોર્યાસી", "પંચાસી", "છ્યાસી", "સિત્યાસી", "અઠ્યાસી", "નેવ્યાસી",
+    "નેવું", "એકાણું", "બાણું", "ત્રાણું", "ચોરાણું", "પંચાણું", "છન્નું", "સત્તાણું", "અઠ્ઠાણું", "નવ્વાણું",
+)
+assert len(WORDS_0_99) == 100
+
+# "એકસો", "બસો", "ત્રણસો", ... written as one word, as on the printed bill
+HUNDREDS = ("",) + tuple("બસો" if n == 2 else WORDS_0_99[n] + "સો" for n in range(1, 10))
+
+# Indian grouping: crore, lakh, thousand, then the last three digits
+SCALES = ((10**7, "કરોડ"), (10**5, "લાખ"), (1000, "હજાર"))
+
+DIGITS = str.maketrans("0123456789", "૦૧૨૩૪૫૬૭૮૯")
+ASCII_DIGITS = str.maketrans("૦૧૨૩૪૫૬૭૮૯", "0123456789")
+
+RUPEES_SUFFIX = "પુરા"
+PAISE = "પૈસા"
+
+# ---------------------------------------------------------
+# 2. CONVERSION
+# ---------------------------------------------------------
+def to_gujarati_digits(value):
+    """'2025' -> '૨૦૨૫'. Anything that is not an ASCII digit is left alone."""
+    return str(value).translate(DIGITS)
+
+
+def group_digits(n):
+    """Indian digit grouping: 12161 -> '12,161', 123456 -> '1,23,456' (the
+    last three digits, then pairs)."""
+    head, tail = divmod(n, 1000)
+    if not head:
+        return str(tail)
+    pairs = []
+    while head:
+        head, pair = divmod(head, 100)
+        pairs.append("%02d" % pair if head else str(pair))
+    return ",".join(reversed(pairs)) + ",%03d" % tail
+
+
+def format_amount(amount):
+    """A rupee amount in grouped Gujarati digits: 123456.5 -> '૧,૨૩,૪૫૬.૫૦';
+    whole rupees are shown without paise."""
+    rupees, paise = parse_amount(amount)
+    text = group_digits(rupees) + (".%02d" % paise if paise else "")
+    return to_gujarati_digits(text)
+
+
+def financial_year(start_year):
+    """2024 -> '૨૦૨૪-૨૫'"""
+    return to_gujarati_digits("%d-%02d" % (start_year, (start_year + 1) % 100))
+
+
+@lru_cache(maxsize=4096)
+def number_to_words(n):
+    """Gujarati words for a non-negative integer, e.g. 12161 -> 'બાર હજાર એકસો એકસઠ'."""
+    if n < 0:
+        raise ValueError("negative amounts cannot be written in words")
+    if n < 100:
+        return WORDS_0_99[n]
+    words = []
+    for scale, name in SCALES:
+        if n >= scale:
+            count, n = divmod(n, scale)
+            # Above 99 crore the crore count is itself spelled out in full
+            words.append(number_to_words(count) + " " + name)
+    if n >= 100:
+        hundreds, n = divmod(n, 100)
+        words.append(HUNDREDS[hundreds])
+    if n:
+        words.append(WORDS_0_99[n])
+    return " ".join(words)
+
+
+def parse_amount(amount):
+    """Split a rupee amount (int, Decimal or a string that may use Gujarati
+    digits and thousands commas) into whole rupees and paise."""
+    text = str(amount).translate(ASCII_DIGITS).replace(",", "").strip()
+    try:
+        value = Decimal(text)
+    except InvalidOperation:
+        raise ValueError("not an amount: %r" % amount) from None
+    if not value.is_finite():
+        raise ValueError("not an amount: %r" % amount)
+    try:
+        # Raises once the amount has more digits than the decimal context holds
+        exact = value == value.quantize(Decimal("0.01"))
+    except InvalidOperation:
+        raise ValueError("amount is too large: %r" % amount) from None
+    if value < 0 or not exact:
+        raise ValueError("amount must be positive with at most two decimals: %r" % amount)
+    paise = int(value * 100)
+    return divmod(paise, 100)
+
+
+def format_paise(paise):
+    """1216150 -> '12161.50', -25 -> '-0.25'; whole rupees are shown
+    without paise."""
+    sign = "-" if paise < 0 else ""
+    rupees, paise = divmod(abs(paise), 100)
+    return "%s%d.%02d" % (sign, rupees, paise) if paise else "%s%d" % (sign, rupees)
+
+
+@lru_cache(maxsize=4096)
+def amount_in_words(amount):
+    """The words that follow "રૂપિયા" on the bill: 12161 -> 'બાર હજાર એકસો
+    એકસઠ પુરા'; 10.50 -> 'દસ અને પચાસ પૈસા'."""
+    rupees, paise = parse_amount(amount)
+    if not paise:
+        return "%s %s" % (number_to_words(rupees), RUPEES_SUFFIX)
+    return "%s અને %s %s" % (number_to_words(rupees), number_to_words(paise), PAISE)
+
+
+def convert_many(amounts):
+    """amount_in_words() over a whole column. Each distinct amount is converted
+    once; a month of bills repeats the same few rates many times."""
+    table = {}
+    out = []
+    for amount in amounts:
+        words = table.get(amount)
+        if words is None:
+            words = table[amount] = amount_in_words(amount)
+        out.append(words)
+    return out
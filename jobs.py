@@ -0,0 +1,144 @@
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+# ---------------------------------------------------------
+# 1. JOBS
+# ---------------------------------------------------------
+# Heavy exports (batch ZIPs, PDF conversion) run in the background instead of
+# inside the Streamlit script, so the session that started them (and every
+# other session on the server) keeps getting fast reruns. The UI submits a job,
+# polls its status, and downloads the result once it is done.
+#
+# A job function is called as fn(job, *args). It reports progress with
+# job.report(done, total), which also raises JobCancelled once the job has
+# been cancelled, so long jobs stop at their next progress step. Temporary
+# files a job writes are listed in job.files and removed when the job fails,
+# is cancelled, or is forgotten.
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+@dataclass
+class Job:
+    id: int
+    kind: str
+    owner: str = None
+    status: str = QUEUED
+    done: int = 0
+    total: int = None
+    result: object = None
+    error: str = None
+    created: float = field(default_factory=time.time)
+    started: float = None
+    finished: float = None
+    files: list = field(default_factory=list)
+    _cancel: threading.Event = field(default_factory=threading.Event, repr=False)
+    _future: object = field(default=None, repr=False)
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def report(self, done, total=None):
+        if self._cancel.is_set():
+            raise JobCancelled()
+        self.done = done
+        if total is not None:
+            self.total = total
+
+    def remove_files(self):
+        for path in self.files:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self.files = []
+
+# ---------------------------------------------------------
+# 2. QUEUE
+# ---------------------------------------------------------
+class JobQueue:
+    """Background jobs on a bounded thread pool. At most `workers` jobs run at
+    once; up to `max_pending` more wait in the queue (submit() raises
+    RuntimeError beyond that), and each owner may have `per_owner` jobs
+    unfinished at a time. Finished jobs are forgotten after `keep` seconds."""
+
+    def __init__(self, workers=2, max_pending=20, per_owner=3, keep=3600):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.per_owner = per_owner
+        self.keep = keep
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _run(self, job, fn, args):
+        if job.cancelled:
+            job.status, job.finished = CANCELLED, time.time()
+            return
+        job.status, job.started = RUNNING, time.time()
+        try:
+            job.result = fn(job, *args)
+            job.status = DONE
+        except JobCancelled:
+            job.status = CANCELLED
+        except Exception as e:
+            job.error = "%s: %s" % (type(e).__name__, e)
+            job.status = FAILED
+        if job.status != DONE:
+            job.remove_files()
+        job.finished = time.time()
+
+    def _expire(self):
+        cutoff = time.time() - self.keep
+        for job in [j for j in self._jobs.values() if j.finished and j.finished < cutoff]:
+            job.remove_files()
+            del self._jobs[job.id]
+
+    def submit(self, kind, fn, *args, owner=None):
+        with self._lock:
+            self._expire()
+            unfinished = [j for j in self._jobs.values() if j.status not in FINISHED]
+            if sum(j.status == QUEUED for j in unfinished) >= self.max_pending:
+                raise RuntimeError("The job queue is full, try again in a moment")
+            if owner is not None and sum(j.owner == owner for j in unfinished) >= self.per_owner:
+                raise RuntimeError("At most %d jobs can run at once" % self.per_owner)
+            job = Job(next(self._ids), kind, owner)
+            self._jobs[job.id] = job
+        job._future = self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def jobs(self, owner=None):
+        """Jobs, newest first (only those of `owner` if given)."""
+        with self._lock:
+            jobs = [j for j in self._jobs.values() if owner is None or j.owner == owner]
+        return sorted(jobs, key=lambda j: j.id, reverse=True)
+
+    def cancel(self, job_id):
+        """Cancel a queued job outright, or ask a running one to stop."""
+        job = self._jobs.get(job_id)
+        if job is None or job.status in FINISHED:
+            return False
+        job._cancel.set()
+        if job._future is not None and job._future.cancel():
+            job.status, job.finished = CANCELLED, time.time()
+        return True
+
+    def shutdown(self):
+        for job in self.jobs():
+            self.cancel(job.id)
+        self._executor.shutdown(wait=True)
+        for job in self.jobs():
+            job.remove_files()
@@ -0,0 +1,431 @@
+import re
+from dataclasses import dataclass, field
+from html import escape
+from string import Formatter
+
+# ---------------------------------------------------------
+# 1. LAYOUT NODES
+# ---------------------------------------------------------
+# A bill is described once as a tree of these nodes and rendered by both the
+# DOCX writer and the HTML preview. Run text is a str.format template: a
+# "{amount}" inside it is bound to that bill field and filled in at render time.
+@dataclass(slots=True)
+class Run:
+    text: str
+    bold: bool = False
+    underline: bool = False
+    strike: bool = False
+    size: float = None  # points
+
+
+@dataclass(slots=True)
+class Paragraph:
+    runs: list = field(default_factory=list)
+    align: str = "left"  # left / center / right
+
+
+@dataclass(slots=True)
+class NumberedList:
+    items: list = field(default_factory=list)  # of Paragraph
+
+
+@dataclass(slots=True)
+class Cell:
+    paragraphs: list = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class Table:
+    rows: list = field(default_factory=list)  # of lists of Cell
+    widths: list = None  # column widths in mm
+    grid: bool = False
+    autofit: bool = True
+
+
+@dataclass(slots=True)
+class DataTable:
+    """A grid whose body rows come from a field holding a sequence of rows
+    (tuples of cell strings), between fixed header and footer rows. The
+    header repeats on every page the table runs onto."""
+    header: list  # of lists of Cell
+    source: str  # field name of the body rows
+    footer: list = field(default_factory=list)  # of lists of Cell
+    widths: list = None  # column widths in mm
+    size: float = None  # body font size in points
+    rows_per_page: int = 30  # preview only; Word breaks pages itself
+
+
+@dataclass(slots=True)
+class Layout:
+    pages: list = field(default_factory=list)  # of lists of blocks
+    page_size: tuple = (210, 297)  # mm
+    margins: tuple = (15, 15, 15, 20)  # top, right, bottom, left in mm
+    font_name: str = "Arial"  # Fallback font, systems handle Gujarati differently
+    font_size: float = 11
+
+
+def p(*runs, align="left"):
+    """Shorthand for a paragraph; plain strings become unformatted runs."""
+    return Paragraph([Run(r) if isinstance(r, str) else r for r in runs], align)
+
+
+def runs_of(block):
+    if isinstance(block, Paragraph):
+        yield from block.runs
+    elif isinstance(block, NumberedList):
+        for item in block.items:
+            yield from item.runs
+    elif isinstance(block, (Table, DataTable)):
+        rows = block.rows if isinstance(block, Table) else block.header + block.footer
+        for row in rows:
+            for cell in row:
+                for para in cell.paragraphs:
+                    yield from para.runs
+
+
+def bound_fields(block):
+    """Names of the bill fields a block's text depends on."""
+    names = set()
+    for run in runs_of(block):
+        names.update(name for _, name, _, _ in Formatter().parse(run.text) if name)
+    if isinstance(block, DataTable):
+        names.add(block.source)
+    return tuple(sorted(names))
+
+# ---------------------------------------------------------
+# 2. DOCX WRITER
+# ---------------------------------------------------------
+_DOCX_ALIGN = {"left": None, "center": "CENTER", "right": "RIGHT"}
+
+
+def _complex_script(rPr, font_name=None, bold=False, size=None):
+    # Word formats Gujarati with the complex-script properties (w:cs, w:bCs,
+    # w:szCs); the plain ones python-docx sets only reach Latin text.
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
+
+    if font_name:
+        rPr.get_or_add_rFonts().set(qn("w:cs"), font_name)
+    if bold:
+        rPr.get_or_add_bCs()
+    if size:
+        sz_cs = OxmlElement("w:szCs")
+        sz_cs.set(qn("w:val"), str(int(size * 2)))
+        rPr.find(qn("w:sz")).addnext(sz_cs)
+
+
+def _write_runs(para, runs, values):
+    from docx.shared import Pt
+
+    for r in runs:
+        run = para.add_run(r.text.format_map(values))
+        if r.bold:
+            run.bold = True
+        if r.underline:
+            run.underline = True
+        if r.strike:
+            run.font.strike = True
+        if r.size:
+            run.font.size = Pt(r.size)
+        if r.bold or r.size:
+            _complex_script(run._r.get_or_add_rPr(), bold=r.bold, size=r.size)
+
+
+def _write_paragraph(para, node, values):
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+
+    if _DOCX_ALIGN[node.align]:
+        para.alignment = getattr(WD_ALIGN_PARAGRAPH, _DOCX_ALIGN[node.align])
+    _write_runs(para, node.runs, values)
+
+
+def _write_row(row_cells, row, widths, values):
+    from docx.shared import Mm
+
+    for i, (cell, cell_node) in enumerate(zip(row_cells.cells, row)):
+        if widths:
+            cell.width = Mm(widths[i])
+        for j, para_node in enumerate(cell_node.paragraphs):
+            para = cell.paragraphs[0] if j == 0 else cell.add_paragraph()
+            _write_paragraph(para, para_node, values)
+
+
+def _write_table(doc, node, values):
+    table = doc.add_table(rows=len(node.rows), cols=len(node.rows[0]))
+    if node.grid:
+        table.style = "Table Grid"
+    if not node.autofit:
+        table.autofit = False
+    for row_cells, row in zip(table.rows, node.rows):
+        _write_row(row_cells, row, node.widths, values)
+
+
+def _row_property(tr, name):
+    from docx.oxml import OxmlElement
+
+    tr.get_or_add_trPr().append(OxmlElement(name))
+
+
+def _write_data_table(doc, node, values):
+    # table.add_row() re-reads the grid and copies cell properties on every
+    # call, which gets slow for long tables. Body rows are instead stamped out
+    # of one prototype <w:tr> with lxml: copy, set the texts, insert.
+    from copy import deepcopy
+
+    from docx.oxml.ns import qn
+    from docx.shared import Mm, Pt
+
+    table = doc.add_table(rows=len(node.header), cols=len(node.header[0]))
+    table.style = "Table Grid"
+    table.autofit = False
+    for row_cells, row in zip(table.rows, node.header):
+        _write_row(row_cells, row, node.widths, values)
+        _row_property(row_cells._tr, "w:tblHeader")
+
+    prototype = table.add_row()
+    for i, cell in enumerate(prototype.cells):
+        if node.widths:
+            cell.width = Mm(node.widths[i])
+        run = cell.paragraphs[0].add_run("-")
+        if node.size:
+            run.font.size = Pt(node.size)
+            _complex_script(run._r.get_or_add_rPr(), size=node.size)
+    _row_property(prototype._tr, "w:cantSplit")
+    proto_tr = prototype._tr
+    t_tag = qn("w:t")
+    for t in proto_tr.iter(t_tag):
+        t.set(qn("xml:space"), "preserve")
+    for row in values[node.source]:
+        tr = deepcopy(proto_tr)
+        for t, text in zip(tr.iter(t_tag), row):
+            t.text = text
+        proto_tr.addprevious(tr)
+    table._tbl.remove(proto_tr)
+
+    for row in node.footer:
+        _write_row(table.add_row(), row, node.widths, values)
+
+
+def write_docx(layout, values):
+    """Build a python-docx Document for `layout` with the given field values."""
+    from docx import Document
+    from docx.shared import Mm, Pt
+
+    doc = Document()
+
+    section = doc.sections[0]
+    section.page_width, section.page_height = (Mm(v) for v in layout.page_size)
+    top, right, bottom, left = layout.margins
+    section.top_margin = Mm(top)
+    section.right_margin = Mm(right)
+    section.bottom_margin = Mm(bottom)
+    section.left_margin = Mm(left)
+
+    font = doc.styles["Normal"].font
+    font.name = layout.font_name
+    font.size = Pt(layout.font_size)
+    _complex_script(font.element.rPr, layout.font_name, size=layout.font_size)
+
+    for number, page in enumerate(layout.pages):
+        if number:
+            doc.add_page_break()
+        for block in page:
+            if isinstance(block, Paragraph):
+                _write_paragraph(doc.add_paragraph(), block, values)
+            elif isinstance(block, NumberedList):
+                for item in block.items:
+                    _write_paragraph(doc.add_paragraph(style="List Number"), item, values)
+            elif isinstance(block, Table):
+                _write_table(doc, block, values)
+            elif isinstance(block, DataTable):
+                _write_data_table(doc, block, values)
+    return doc
+
+# ---------------------------------------------------------
+# 3. HTML RENDERER
+# ---------------------------------------------------------
+# The preview uses short shared classes instead of inline styles; their rules
+# come from html_css(), generated from the sizes and widths the layout uses:
+#   b / u / s      bold, underline, strike
+#   z<size>        font size in points (z7, z14, z10_5)
+#   c / r          centred / right-aligned paragraph
+#   w<permille>    column width as a share of the table (w457 = 45.7%)
+#   g              table with grid lines
+_ALIGN_CLASS = {"left": "", "center": "c", "right": "r"}
+
+
+def _size_class(size):
+    return "z" + ("%g" % size).replace(".", "_")
+
+
+def _width_classes(widths):
+    total = sum(widths)
+    return ["w%d" % round(1000 * w / total) for w in widths]
+
+
+def _html_text(text):
+    # No raw newlines: st.markdown would end the HTML block at a blank line
+    return escape(text).replace("\n", "<br>").replace("\t", "&emsp;")
+
+
+def _html_runs(runs, values):
+    out = []
+    for r in runs:
+        text = _html_text(r.text.format_map(values))
+        classes = [name for name, on in (("b", r.bold), ("u", r.underline), ("s", r.strike)) if on]
+        if r.size:
+            classes.append(_size_class(r.size))
+        out.append('<span class="%s">%s</span>' % (" ".join(classes), text) if classes else text)
+    return "".join(out)
+
+
+def _html_paragraph(node, values):
+    align = _ALIGN_CLASS[node.align]
+    return '<p%s>%s</p>' % (' class="%s"' % align if align else "", _html_runs(node.runs, values))
+
+
+# A long DataTable continues on further preview pages; render_block_html
+# separates them with this marker and HtmlRenderer splits the page there.
+PAGE_BREAK = "<!--page-->"
+
+
+def _html_colgroup(widths):
+    return "<colgroup>%s</colgroup>" % "".join('<col class="%s">' % name for name in _width_classes(widths))
+
+
+def _html_rows(rows, values):
+    return "".join(
+        "<tr>%s</tr>" % "".join(
+            "<td>%s</td>" % "".join(_html_paragraph(para, values) for para in cell.paragraphs) for cell in row)
+        for row in rows)
+
+
+def _html_data_table(block, values):
+    classes = "g " + _size_class(block.size) if block.size else "g"
+    head = '<table class="%s">%s%s' % (
+        classes, _html_colgroup(block.widths) if block.widths else "", _html_rows(block.header, values))
+    sheets = []
+    body = []
+    for row in values[block.source]:
+        body.append("<tr>%s</tr>" % "".join("<td>%s</td>" % escape(text) for text in row))
+        if len(body) == block.rows_per_page:
+            sheets.append(head + "".join(body) + "</table>")
+            body = []
+    sheets.append(head + "".join(body) + _html_rows(block.footer, values) + "</table>")
+    return PAGE_BREAK.join(sheets)
+
+
+def render_block_html(block, values):
+    if isinstance(block, Paragraph):
+        return _html_paragraph(block, values)
+    if isinstance(block, NumberedList):
+        items = "".join("<li>%s</li>" % _html_runs(item.runs, values) for item in block.items)
+        return "<ol>%s</ol>" % items
+    if isinstance(block, Table):
+        return "<table%s>%s%s</table>" % (
+            ' class="g"' if block.grid else "", _html_colgroup(block.widths) if block.widths else "",
+            _html_rows(block.rows, values))
+    if isinstance(block, DataTable):
+        return _html_data_table(block, values)
+    raise TypeError("unknown layout node %r" % type(block).__name__)
+
+
+def minify_css(css):
+    """Drop comments and the whitespace around CSS punctuation."""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s*([{}:;,>])\s*", r"\1", css)
+    return re.sub(r"\s+", " ", css).replace(";}", "}").strip()
+
+
+def html_css(layout, scope=""):
+    """Minified rules for the classes the preview of `layout` uses, each
+    selector prefixed with `scope`."""
+    sizes = set()
+    widths = set()
+    for page in layout.pages:
+        for block in page:
+            sizes.update(run.size for run in runs_of(block) if run.size)
+            if isinstance(block, DataTable) and block.size:
+                sizes.add(block.size)
+            if isinstance(block, (Table, DataTable)) and block.widths:
+                widths.update(_width_classes(block.widths))
+    rules = [
+        "%s .b{font-weight:700}" % scope,
+        "%s .u{text-decoration:underline}" % scope,
+        "%s .s{text-decoration:line-through}" % scope,
+        "%s .u.s{text-decoration:underline line-through}" % scope,
+        "%s .c{text-align:center}" % scope,
+        "%s .r{text-align:right}" % scope,
+    ]
+    rules += ["%s .%s{font-size:%gpt}" % (scope, _size_class(size), size) for size in sorted(sizes)]
+    rules += ["%s .%s{width:%g%%}" % (scope, name, int(name[1:]) / 10) for name in sorted(widths)]
+    return minify_css("".join(rules))
+
+# ---------------------------------------------------------
+# 4. PREVIEW TEMPLATES
+# ---------------------------------------------------------
+# Each block's HTML is rendered once with a sentinel in place of every bound
+# field and split into its static chunks, like the DOCX template: rendering
+# a changed block is then a join of the chunks with the escaped field values.
+_SENTINEL = "\x00"
+
+
+class BlockTemplate:
+    def __init__(self, block, fields):
+        html = render_block_html(block, {name: _SENTINEL + name + _SENTINEL for name in fields})
+        parts = html.split(_SENTINEL)
+        self.chunks = parts[0::2]
+        self.fields = parts[1::2]
+
+    def render(self, values):
+        out = [self.chunks[0]]
+        for name, chunk in zip(self.fields, self.chunks[1:]):
+            out.append(_html_text(values[name]))
+            out.append(chunk)
+        return "".join(out)
+
+
+class HtmlRenderer:
+    """Renders the pages of a layout to HTML, re-rendering only the blocks whose
+    bound fields changed since the previous call. A layout page may come out
+    as several preview pages when a DataTable runs over."""
+
+    def __init__(self, layout):
+        self.layout = layout
+        self.fields = [[bound_fields(block) for block in page] for page in layout.pages]
+        self._templates = {}  # (page, block) -> BlockTemplate (DataTables render directly)
+        self._cache = {}  # (page, block) -> (bound values, html)
+        self._pages = [None] * len(layout.pages)  # layout page -> list of preview pages
+        self._last = []
+        self.rendered = 0  # blocks rendered by the last call, for diagnostics
+        self.changed_pages = []  # preview pages whose HTML differs from the last call
+
+    def _render_block(self, i, j, block, values):
+        if isinstance(block, DataTable):
+            return render_block_html(block, values)
+        template = self._templates.get((i, j))
+        if template is None:
+            template = self._templates[(i, j)] = BlockTemplate(block, self.fields[i][j])
+        return template.render(values)
+
+    def render_pages(self, values):
+        self.rendered = 0
+        for i, page in enumerate(self.layout.pages):
+            rendered = self.rendered
+            html = []
+            for j, block in enumerate(page):
+                key = tuple(values[name] for name in self.fields[i][j])
+                cached = self._cache.get((i, j))
+                if cached is None or cached[0] != key:
+                    cached = (key, self._render_block(i, j, block, values))
+                    self._cache[(i, j)] = cached
+                    self.rendered += 1
+                html.append(cached[1])
+            # An untouched page is returned as the same string as last time
+            if self.rendered > rendered or self._pages[i] is None:
+                self._pages[i] = "".join(html).split(PAGE_BREAK)
+        pages = [sheet for sheets in self._pages for sheet in sheets]
+        self.changed_pages = [k for k, sheet in enumerate(pages)
+                              if k >= len(self._last) or self._last[k] is not sheet]
+        self._last = pages
+        return pages
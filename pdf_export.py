@@ -0,0 +1,193 @@
+import argparse
+import importlib.util
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+# ---------------------------------------------------------
+# 1. CONVERTER POOL
+# ---------------------------------------------------------
+# Starting LibreOffice takes seconds, so PDFs are converted by a small pool of
+# long-lived headless LibreOffice instances, each behind an unoserver listener
+# (pip install unoserver; it must run under a Python that can import uno).
+# Jobs queue up until one of the instances is free. Every instance listens on
+# ports the OS hands out, so several server processes (and the command line)
+# can run pools side by side on one host.
+UNOSERVER = os.environ.get("UNOSERVER", "unoserver")
+START_TIMEOUT = 60  # seconds for LibreOffice to come up
+START_ATTEMPTS = 3  # a port handed out may be taken again before unoserver binds it
+
+
+def pdf_available():
+    """True if both the unoserver command and its Python client are installed."""
+    return shutil.which(UNOSERVER) is not None and importlib.util.find_spec("unoserver") is not None
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(port, proc, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("unoserver on port %d exited with code %d" % (port, proc.returncode))
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("unoserver on port %d did not start within %ds" % (port, timeout))
+
+
+class _Server:
+    def __init__(self):
+        self.port = None
+        self.proc = None
+        self.profile = tempfile.mkdtemp(prefix="lo_profile_")
+
+    def ensure_running(self):
+        if self.proc is not None and self.proc.poll() is None:
+            return
+        for attempt in range(1, START_ATTEMPTS + 1):
+            # XML-RPC on `port`, LibreOffice's own UNO socket on a second free port
+            self.port = _free_port()
+            self.proc = subprocess.Popen(
+                [UNOSERVER, "--interface", "127.0.0.1", "--port", str(self.port),
+                 "--uno-port", str(_free_port()), "--user-installation", self.profile, "--quiet"],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            try:
+                _wait_for_port(self.port, self.proc, START_TIMEOUT)
+                return
+            except RuntimeError:
+                self.stop_process()
+                if attempt == START_ATTEMPTS:
+                    raise
+
+    def stop_process(self):
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+    def stop(self):
+        self.stop_process()
+        shutil.rmtree(self.profile, ignore_errors=True)
+
+
+class PdfConverterPool:
+    """A bounded pool of persistent LibreOffice converters.
+
+    `submit()` queues a .docx (bytes) and returns a Future for the PDF bytes;
+    at most `size` conversions run at once, one per LibreOffice instance.
+    Instances are started on first use and restarted if they die.
+    """
+
+    def __init__(self, size=2):
+        try:
+            from unoserver.client import UnoClient
+        except ImportError:
+            raise RuntimeError("PDF export needs unoserver (pip install unoserver)")
+        if not pdf_available():
+            raise RuntimeError("%r not found; install LibreOffice and unoserver" % UNOSERVER)
+        self._client_class = UnoClient
+        self.size = size
+        self._servers = [_Server() for _ in range(size)]
+        self._free = queue.Queue()
+        for server in self._servers:
+            self._free.put(server)
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="pdf")
+
+    def _convert(self, docx_bytes):
+        server = self._free.get()
+        try:
+            server.ensure_running()
+            client = self._client_class(server="127.0.0.1", port=str(server.port))
+            return client.convert(indata=docx_bytes, convert_to="pdf")
+        finally:
+            self._free.put(server)
+
+    def submit(self, docx_bytes):
+        return self._executor.submit(self._convert, docx_bytes)
+
+    def convert(self, docx_bytes):
+        return self.submit(docx_bytes).result()
+
+    def convert_many(self, docs):
+        """Convert an iterable of .docx bytes, yielding PDFs in order. Only a
+        couple of jobs per instance are queued ahead of the consumer."""
+        window = []
+        for docx_bytes in docs:
+            window.append(self.submit(docx_bytes))
+            if len(window) >= 2 * self.size:
+                yield window.pop(0).result()
+        for future in window:
+            yield future.result()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        for server in self._servers:
+            server.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ---------------------------------------------------------
+# 2. COMMAND LINE (convert a ZIP of bills)
+# ---------------------------------------------------------
+def convert_zip(src, out, pool, progress=None):
+    """Convert every .docx in the ZIP file `src` into a PDF in the ZIP `out`."""
+    with zipfile.ZipFile(src) as zin, zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zout:
+        names = [n for n in zin.namelist() if n.lower().endswith(".docx")]
+        pdfs = pool.convert_many(zin.read(n) for n in names)
+        for done, (name, pdf) in enumerate(zip(names, pdfs), start=1):
+            zout.writestr(os.path.splitext(name)[0] + ".pdf", pdf)
+            if progress:
+                progress(done, len(names))
+    return len(names)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert generated bills to PDF.")
+    parser.add_argument("input", help="a .docx bill, or a ZIP of bills from batch.py")
+    parser.add_argument("-o", "--output", help="PDF (or ZIP of PDFs) to write")
+    parser.add_argument("-j", "--workers", type=int, default=2, help="LibreOffice instances (default: 2)")
+    args = parser.parse_args(argv)
+
+    is_zip = args.input.lower().endswith(".zip")
+    output = args.output or os.path.splitext(args.input)[0] + ("_pdf.zip" if is_zip else ".pdf")
+
+    def progress(done, total):
+        print("\r%d/%d bills" % (done, total), end="", file=sys.stderr, flush=True)
+
+    with PdfConverterPool(args.workers) as pool:
+        if is_zip:
+            count = convert_zip(args.input, output, pool, progress)
+            print(file=sys.stderr)
+        else:
+            with open(args.input, "rb") as f:
+                pdf = pool.convert(f.read())
+            with open(output, "wb") as f:
+                f.write(pdf)
+            count = 1
+    print("%d PDF(s) written to %s" % (count, output), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+import hashlib
+import os
+import tempfile
+
+# ---------------------------------------------------------
+# 1. RECEIPT STORE
+# ---------------------------------------------------------
+# Scanned receipts (tickets, hotel bills) attached to a bill are printed on
+# pages after it. An upload is copied into RECEIPT_DIR once, under its content
+# hash, and the bill's "receipts" field lists the stored names (one per line),
+# so the field is itself a content address: the same scan attached twice, or
+# to two bills, is one file on disk and one image in the document.
+#
+# Batch claims may list files placed in the directory by hand; names always
+# resolve inside RECEIPT_DIR.
+RECEIPT_DIR = os.environ.get("BILL_RECEIPT_DIR", os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".receipts"))
+RECEIPT_TYPES = ("png", "jpg", "jpeg", "gif", "bmp", "tif", "tiff")
+CHUNK = 2**20
+
+
+def store_receipt(f, filename, root=RECEIPT_DIR):
+    """Copy a scan from the binary file object `f` into the store, a chunk
+    at a time, and return its name (<sha256>.<ext>)."""
+    ext = os.path.splitext(filename)[1].lstrip(".").lower()
+    if ext not in RECEIPT_TYPES:
+        raise ValueError("receipts must be images (%s): %r" % (", ".join(RECEIPT_TYPES), filename))
+    os.makedirs(root, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, tmp = tempfile.mkstemp(dir=root, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in iter(lambda: f.read(CHUNK), b""):
+                digest.update(chunk)
+                out.write(chunk)
+        name = "%s.%s" % (digest.hexdigest(), ext)
+        os.replace(tmp, os.path.join(root, name))
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return name
+
+
+def receipt_names(receipts):
+    """The names listed in a bill's "receipts" field (one per line, or
+    separated by semicolons in a spreadsheet cell)."""
+    return [name.strip() for name in receipts.replace(";", "\n").splitlines() if name.strip()]
+
+
+def receipt_path(name, root=RECEIPT_DIR):
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, name))
+    if not path.startswith(root + os.sep):
+        raise ValueError("receipt %r is outside the receipt directory" % name)
+    if not os.path.isfile(path):
+        raise ValueError("receipt not found: %r" % name)
+    return path
@@ -0,0 +1,158 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from bill_layout import resolve_bill
+from gujarati import format_paise, parse_amount
+
+# ---------------------------------------------------------
+# 1. SCHEMA
+# ---------------------------------------------------------
+# Every generated bill is stored with its full field values, so any past bill
+# can be re-rendered exactly. Amounts are kept in paise as integers.
+#
+# `budgets` holds one row per (budget head, financial year) with the sanctioned
+# amount and a running total of what has been billed against it. The total is
+# updated in the same transaction as each insert, so the budget table's
+# "spent" and "remaining" cells are a single-row lookup rather than a scan of
+# the bill history.
+DEFAULT_PATH = os.environ.get("BILL_REGISTER", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                            "bill_register.sqlite3"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bills (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    employee_name TEXT NOT NULL,
+    month TEXT NOT NULL,
+    budget_head TEXT NOT NULL,
+    budget_year TEXT NOT NULL,
+    unit_code TEXT NOT NULL,
+    amount_paise INTEGER NOT NULL,
+    template_version TEXT,
+    fields TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS bills_employee ON bills (employee_name, month);
+CREATE INDEX IF NOT EXISTS bills_month ON bills (month);
+CREATE INDEX IF NOT EXISTS bills_budget_head ON bills (budget_head, budget_year);
+CREATE INDEX IF NOT EXISTS bills_unit_code ON bills (unit_code);
+
+CREATE TABLE IF NOT EXISTS budgets (
+    budget_head TEXT NOT NULL,
+    budget_year TEXT NOT NULL,
+    sanctioned_paise INTEGER NOT NULL DEFAULT 0,
+    spent_paise INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (budget_head, budget_year)
+);
+"""
+
+SEARCH_COLUMNS = ("employee_name", "month", "budget_head", "unit_code")
+
+
+def to_paise(amount):
+    rupees, paise = parse_amount(amount)
+    return rupees * 100 + paise
+
+# ---------------------------------------------------------
+# 2. REGISTER
+# ---------------------------------------------------------
+class BillRegister:
+    """SQLite-backed register of generated bills. Safe to share between
+    threads (one connection, serialized by a lock); several processes may
+    open the same file, SQLite's WAL journal keeps readers unblocked."""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def set_budget(self, budget_head, budget_year, sanctioned):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO budgets (budget_head, budget_year, sanctioned_paise) VALUES (?, ?, ?) "
+                "ON CONFLICT (budget_head, budget_year) DO UPDATE SET sanctioned_paise = excluded.sanctioned_paise",
+                (budget_head, budget_year, to_paise(sanctioned)))
+
+    def _budget_row(self, budget_head, budget_year):
+        return self._db.execute(
+            "SELECT sanctioned_paise, spent_paise FROM budgets WHERE budget_head = ? AND budget_year = ?",
+            (budget_head, budget_year)).fetchone()
+
+    @staticmethod
+    def _budget_fields(sanctioned, spent):
+        return {
+            "budget_sanctioned": format_paise(sanctioned),
+            "budget_spent": format_paise(spent),
+            "budget_balance": format_paise(sanctioned - spent),
+        }
+
+    def budget_fields(self, bill, unrecorded=0):
+        """Budget table values for a bill that is about to be added, i.e. with
+        its own amount counted as spent, plus `unrecorded` paise billed to the
+        head ahead of it but not recorded yet. Empty if the head has no budget."""
+        bill = resolve_bill(bill)
+        if not bill["budget_head"]:
+            return {}
+        with self._lock:
+            row = self._budget_row(bill["budget_head"], bill["budget_year"])
+        if row is None:
+            return {}
+        spent = row["spent_paise"] + unrecorded + to_paise(bill["amount"])
+        return self._budget_fields(row["sanctioned_paise"], spent)
+
+    def add_bill(self, bill, template_version=None):
+        """Record a bill and charge it to its budget head. Returns the new id
+        and the bill's fields with the budget table filled in."""
+        bill = resolve_bill(bill)
+        amount = to_paise(bill["amount"])
+        with self._lock, self._db:
+            fields = dict(bill)
+            if bill["budget_head"]:
+                # Charge and read back in one statement: another process sharing
+                # the register may be charging the same head at the same time
+                row = self._db.execute(
+                    "UPDATE budgets SET spent_paise = spent_paise + ? WHERE budget_head = ? AND budget_year = ? "
+                    "RETURNING sanctioned_paise, spent_paise",
+                    (amount, bill["budget_head"], bill["budget_year"])).fetchone()
+                if row is not None:
+                    fields.update(self._budget_fields(row["sanctioned_paise"], row["spent_paise"]))
+            cursor = self._db.execute(
+                "INSERT INTO bills (created_at, employee_name, month, budget_head, budget_year, unit_code, "
+                "amount_paise, template_version, fields) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), bill["employee_name"], bill["month"], bill["budget_head"],
+                 bill["budget_year"], bill["unit_code"], amount, template_version,
+                 json.dumps(fields, ensure_ascii=False)))
+        return cursor.lastrowid, fields
+
+    def get_bill(self, bill_id):
+        """The stored fields of a bill, ready to be rendered again."""
+        with self._lock:
+            row = self._db.execute("SELECT fields FROM bills WHERE id = ?", (bill_id,)).fetchone()
+        if row is None:
+            raise KeyError(bill_id)
+        return json.loads(row["fields"])
+
+    def search(self, limit=100, **filters):
+        """Newest bills matching exact filters on employee_name, month,
+        budget_head and unit_code (each served by an index)."""
+        unknown = set(filters) - set(SEARCH_COLUMNS)
+        if unknown:
+            raise ValueError("cannot search on %s" % ", ".join(sorted(unknown)))
+        where = [(name, value) for name, value in filters.items() if value]
+        sql = "SELECT id, created_at, employee_name, month, budget_head, unit_code, amount_paise FROM bills"
+        if where:
+            sql += " WHERE " + " AND ".join("%s = ?" % name for name, _ in where)
+        sql += " ORDER BY id DESC LIMIT ?"
+        with self._lock:
+            rows = self._db.execute(sql, [value for _, value in where] + [limit]).fetchall()
+        return [dict(row, amount=format_paise(row["amount_paise"])) for row in rows]
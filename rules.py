@@ -0,0 +1,199 @@
+import json
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from diary import parse_journeys
+from gujarati import ASCII_DIGITS, format_paise
+
+# ---------------------------------------------------------
+# 1. RATE TABLES
+# ---------------------------------------------------------
+# TA/DA entitlements by pay level (1-18, as in the pay matrix). Keep these in
+# step with the university's current TA rules.
+#   (lowest pay level, daily allowance per full day, highest travel class)
+LEVEL_BANDS = (
+    (1, 300, "sleeper"),
+    (6, 400, "3ac"),
+    (9, 500, "2ac"),
+    (12, 700, "1ac"),
+)
+MAX_LEVEL = 18
+
+# Travel classes from lowest to highest; both English and Gujarati spellings
+CLASS_RANKS = {
+    "general": 0, "જનરલ": 0, "st": 0, "એસ.ટી.": 0,
+    "sleeper": 1, "સ્લીપર": 1, "2s": 1,
+    "3ac": 2, "chair car": 2, "cc": 2, "ચેરકાર": 2,
+    "2ac": 3,
+    "1ac": 4, "economy": 4, "ઇકોનોમી": 4,
+}
+
+# Highest fare per km refunded for a class, used when a leg travelled above
+# its entitlement: the fare is then paid as for the entitled class (by rank)
+FARE_PER_KM = (0.5, 0.8, 2.0, 3.0, 5.0)
+
+# Rupees per km for modes that are paid mileage
+MILEAGE_RATES = {
+    "own car": 8.0, "car": 8.0, "પોતાની કાર": 8.0, "પોતાનું વાહન": 8.0,
+    "two-wheeler": 3.0, "scooter": 3.0, "ટુ-વ્હીલર": 3.0,
+    "taxi": 10.0, "ટેક્સી": 10.0,
+}
+
+
+@lru_cache(maxsize=1)
+def level_tables():
+    """Arrays indexed by pay level: the daily allowance rate and the highest
+    travel class rank. Index 0 (no or unknown level) is NaN / -1."""
+    da_rate = np.full(MAX_LEVEL + 1, np.nan)
+    class_limit = np.full(MAX_LEVEL + 1, -1)
+    for lowest, rate, travel_class in LEVEL_BANDS:
+        da_rate[lowest:] = rate
+        class_limit[lowest:] = CLASS_RANKS[travel_class]
+    return da_rate, class_limit
+
+# ---------------------------------------------------------
+# 2. CHECKS
+# ---------------------------------------------------------
+# Every leg of every claim goes into one table and each rule is a column-wise
+# comparison over all of them at once; violations are kept as bit flags.
+FLAGS = (
+    ("level", "pay level missing, unknown or not a whole number"),
+    ("da_rate", "daily allowance rate above the entitled rate"),
+    ("da_days", "daily allowance days not in half days"),
+    ("mileage_rate", "mileage rate above the entitled rate for the mode"),
+    ("mileage_mode", "mileage claimed for a mode that is not paid mileage"),
+    ("mileage_km", "mileage km more than the journey distance"),
+    ("travel_class", "travel class above entitlement"),
+    ("fare", "fare above the entitled class's fare for the distance"),
+)
+FLAG_BITS = {name: 1 << bit for bit, (name, _) in enumerate(FLAGS)}
+
+NUMERIC = ("fare", "km", "mileage_km", "mileage_rate", "da_days", "da_rate", "other")
+
+
+def _normalize(series):
+    return series.fillna("").astype(str).str.strip().str.lower()
+
+
+def legs_frame(claims):
+    """One row per journey leg of every claim, with the claim's position in
+    `claims` and its pay level. Claims whose journeys can't be parsed are
+    left out (rendering reports them)."""
+    rows = []
+    for number, claim in enumerate(claims, start=1):
+        try:
+            legs = parse_journeys(claim.get("journeys", ""))
+        except ValueError:
+            continue
+        level = claim.get("pay_level", "")
+        for leg_number, leg in enumerate(legs, start=1):
+            rows.append({**leg, "claim": number, "leg": leg_number, "pay_level": level})
+    frame = pd.DataFrame(rows, columns=["claim", "leg", "pay_level", "mode", "travel_class", *NUMERIC])
+    for name in NUMERIC + ("pay_level",):
+        text = frame[name].astype(str).str.translate(ASCII_DIGITS).str.replace(",", "")
+        frame[name] = pd.to_numeric(text, errors="coerce")
+    return frame
+
+
+def check_legs(frame):
+    """Add entitlement columns (fare, daily allowance, mileage and their
+    rates) and a `flags` bit mask to a legs_frame()."""
+    da_rate, class_limit = level_tables()
+    level = frame["pay_level"].to_numpy()
+    # Levels are whole numbers: "3.5" is not level 3
+    known = np.isfinite(level) & (level >= 1) & (level <= MAX_LEVEL) & (np.nan_to_num(level) % 1 == 0)
+    index = np.where(known, np.nan_to_num(level), 0).astype(int)
+
+    days = frame["da_days"].fillna(0).to_numpy()
+    mileage_km = frame["mileage_km"].fillna(0).to_numpy()
+    claimed_mileage_rate = frame["mileage_rate"].fillna(0).to_numpy()
+    mode_rate = _normalize(frame["mode"]).map(MILEAGE_RATES).to_numpy(dtype=float)
+    class_rank = _normalize(frame["travel_class"]).map(CLASS_RANKS).fillna(-1).to_numpy()
+
+    fare = frame["fare"].fillna(0).to_numpy()
+    above_class = known & (class_rank > class_limit[index])
+    fare_ceiling = frame["km"].fillna(0).to_numpy() * np.asarray(FARE_PER_KM)[np.maximum(class_limit[index], 0)]
+    frame["fare_entitled"] = np.round(np.where(above_class, np.minimum(fare, fare_ceiling), fare), 2)
+    frame["da_rate_entitled"] = np.nan_to_num(da_rate[index])
+    frame["da_entitled"] = np.round(days * frame["da_rate_entitled"].to_numpy(), 2)
+    frame["mileage_rate_entitled"] = np.nan_to_num(mode_rate)
+    frame["mileage_entitled"] = np.round(mileage_km * frame["mileage_rate_entitled"].to_numpy(), 2)
+
+    checks = {
+        "level": ~known & ((days > 0) | (class_rank >= 0)),
+        "da_rate": known & (days > 0) & (frame["da_rate"].fillna(0).to_numpy() > da_rate[index]),
+        "da_days": (days * 2) % 1 != 0,
+        "mileage_rate": (mileage_km > 0) & np.isfinite(mode_rate) & (claimed_mileage_rate > mode_rate),
+        "mileage_mode": (mileage_km > 0) & ~np.isfinite(mode_rate),
+        "mileage_km": (mileage_km > frame["km"].to_numpy()),  # NaN distance never compares greater
+        "travel_class": above_class,
+        "fare": above_class & (fare > fare_ceiling),
+    }
+    flags = np.zeros(len(frame), dtype=np.int64)
+    for name, violated in checks.items():
+        flags |= np.where(violated, FLAG_BITS[name], 0)
+    frame["flags"] = flags
+    return frame
+
+
+def flag_messages(flags):
+    return [message for name, message in FLAGS if flags & FLAG_BITS[name]]
+
+
+def check_claims(claims):
+    """Check the travel diaries of a list of claims in one pass. Returns
+    {claim number (1-based): ["journey 2: ...", ...]} for claims with
+    violations; claims without journeys have nothing to check."""
+    frame = check_legs(legs_frame(claims))
+    violations = {}
+    flagged = frame[frame["flags"] != 0]
+    for claim, leg, flags in zip(flagged["claim"], flagged["leg"], flagged["flags"]):
+        violations.setdefault(int(claim), []).extend(
+            "journey %d: %s" % (leg, message) for message in flag_messages(int(flags)))
+    return violations
+
+
+def entitlements(claims):
+    """Per claim: the fare, daily allowance and mileage its legs are entitled
+    to (rupees), indexed by claim number."""
+    frame = check_legs(legs_frame(claims))
+    return frame.groupby("claim")[["fare_entitled", "da_entitled", "mileage_entitled"]].sum()
+
+# ---------------------------------------------------------
+# 3. APPLYING ENTITLEMENTS
+# ---------------------------------------------------------
+# A bill is generated from its travel diary, so entitlements are fed into it
+# by limiting each leg's fare and rates to what the rules allow; the diary's
+# total, and with it the claim amount, then follows. Legs of claims without a
+# known pay level are left as claimed (the "level" flag reports them).
+def _rupees(value):
+    return format_paise(int(round(value * 100)))
+
+
+def apply_entitlements(claims):
+    """Copies of `claims` with every leg limited to its entitlements. Claims
+    whose legs change get their amount in words cleared, to be written out
+    again from the new total."""
+    claims = list(claims)
+    frame = check_legs(legs_frame(claims))
+    changed = {}
+    for row in frame.itertuples(index=False):
+        if row.flags & FLAG_BITS["level"]:
+            continue
+        limits = {
+            "fare": (row.fare, row.fare_entitled),
+            "da_rate": (row.da_rate, row.da_rate_entitled if row.da_days > 0 else row.da_rate),
+            "mileage_rate": (row.mileage_rate, row.mileage_rate_entitled if row.mileage_km > 0 else row.mileage_rate),
+        }
+        for name, (claimed, entitled) in limits.items():
+            if claimed > entitled:  # NaN (nothing claimed) never compares greater
+                legs = changed.get(row.claim)
+                if legs is None:
+                    legs = changed[row.claim] = parse_journeys(claims[row.claim - 1]["journeys"])
+                legs[row.leg - 1][name] = _rupees(entitled)
+    for number, legs in changed.items():
+        claims[number - 1] = {**claims[number - 1], "journeys": json.dumps(legs, ensure_ascii=False),
+                              "amount_words": ""}
+    return claims
@@ -0,0 +1,10 @@
+# Runs app.py with long cache headers on the bundled fonts:
+#   streamlit run serve.py
+# (`streamlit run app.py` still works, the fonts are then revalidated on
+# every page load.)
+import streamlit as st
+from starlette.middleware import Middleware
+
+from fonts import ImmutableFontsMiddleware
+
+app = st.App("app.py", middleware=[Middleware(ImmutableFontsMiddleware)])
@@ -0,0 +1,93 @@
+import io
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import batch
+from register import BillRegister
+
+
+@pytest.fixture
+def threaded(monkeypatch):
+    # Threads instead of worker processes, so that a render can be made to fail
+    monkeypatch.setattr(batch, "ProcessPoolExecutor",
+                        lambda max_workers, mp_context: ThreadPoolExecutor(max_workers))
+    render = batch.render_docx_bytes
+
+    def render_or_fail(bill):
+        if bill["employee_name"] == "FAIL":
+            raise RuntimeError("render failed")
+        return render(bill)
+
+    monkeypatch.setattr(batch, "render_docx_bytes", render_or_fail)
+
+
+@pytest.fixture
+def register():
+    register = BillRegister(":memory:")
+    register.set_budget("H1", "2025-26", "1000")
+    register.set_budget("H2", "2025-26", "500")
+    yield register
+    register.close()
+
+
+def _claim(name, amount, head="H1"):
+    return {"employee_name": name, "amount": amount, "designation": "x",
+            "budget_head": head, "budget_year": "2025-26"}
+
+
+def _recorded(register):
+    rows = register._db.execute("SELECT id FROM bills ORDER BY id").fetchall()
+    return [register.get_bill(row["id"]) for row in rows]
+
+
+def test_failed_rows_are_not_recorded_or_charged(threaded, register):
+    claims = [
+        _claim("A", "100"),
+        _claim("FAIL", "200"),
+        _claim("B", "50.50", head="H2"),
+        _claim("C", "300"),
+        _claim("D", "", head="H2"),  # invalid: never rendered
+        _claim("E", "25.25"),
+    ]
+    out = io.BytesIO()
+    result = batch.generate_batch(claims, out, workers=3, register=register)
+
+    assert result.bills == 4
+    assert [number for number, _ in result.errors] == [2, 5]
+    bills = _recorded(register)
+    assert [(b["employee_name"], b["budget_spent"], b["budget_balance"]) for b in bills] == [
+        ("A", "100", "900"),
+        ("B", "50.50", "449.50"),
+        ("C", "400", "600"),
+        ("E", "425.25", "574.75"),
+    ]
+    assert register.budget_fields(_claim("X", "0"))["budget_spent"] == "425.25"
+    assert register.budget_fields(_claim("X", "0", head="H2"))["budget_spent"] == "50.50"
+
+    # The bills in the archive show the same figures as the register
+    with zipfile.ZipFile(out) as archive:
+        names = [name for name in archive.namelist() if name.endswith(".docx")]
+        assert names == ["0001_A.docx", "0003_B.docx", "0004_C.docx", "0006_E.docx"]
+        for name, bill in zip(names, bills):
+            with zipfile.ZipFile(archive.open(name)) as docx:
+                xml = docx.read("word/document.xml").decode()
+            rupees, _, paise = bill["budget_balance"].partition(".")
+            assert ">%s<" % rupees in xml and ">%s<" % (paise or "00") in xml
+
+
+def test_overspent_budget_renders(threaded, register):
+    claims = [_claim("A", "900"), _claim("B", "100.25")]
+    result = batch.generate_batch(claims, io.BytesIO(), workers=2, register=register)
+    assert result.errors == []
+    assert _recorded(register)[1]["budget_balance"] == "-0.25"
+
+
+@pytest.mark.parametrize("filename, data", [
+    ("claims.csv", b"\xff\xfeamount"),
+    ("claims.xlsx", b"not a workbook"),
+])
+def test_unreadable_claims_file(filename, data):
+    with pytest.raises(ValueError, match="cannot read " + filename):
+        list(batch.read_claims(io.BytesIO(data), filename))
@@ -0,0 +1,22 @@
+from io import BytesIO
+
+from docx import Document
+from docx.oxml.ns import qn
+
+from bill_docx import create_docx, render_docx_bytes
+
+
+def _text(doc):
+    # Empty runs are left out: the template keeps a run for every field
+    return [t.text for t in doc.element.body.iter(qn("w:t")) if t.text]
+
+
+def test_compiled_matches_create_docx():
+    bill = {"employee_name": "R&D <Lab> \"A\"", "designation": "x > y & z", "scheme_name": "<&>"}
+    compiled = Document(BytesIO(render_docx_bytes(bill)))
+    assert _text(compiled) == _text(create_docx(bill))
+
+
+def test_compiled_drops_characters_xml_forbids():
+    compiled = Document(BytesIO(render_docx_bytes({"employee_name": "A\x0bB\x00"})))
+    assert _text(compiled) == _text(create_docx({"employee_name": "AB"}))
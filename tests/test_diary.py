@@ -0,0 +1,31 @@
+import pytest
+
+from diary import diary_values, journeys_amount, leg_amounts
+
+
+def test_leg_amounts():
+    leg = {"fare": "45", "mileage_km": "30", "mileage_rate": "2.5", "da_days": "1.5", "da_rate": "250", "other": "10"}
+    assert leg_amounts(leg) == {"fare": 4500, "mileage": 7500, "da": 37500, "other": 1000, "total": 50500}
+
+
+def test_journeys_amount():
+    assert journeys_amount("") is None
+    assert journeys_amount('[{"fare": "45"}, {"fare": "૧૦.૫૦"}]') == "55.50"
+
+
+@pytest.mark.parametrize("value", ["x", "-1", "nan", "Infinity", "sNaN", "1e40", "1000001"])
+def test_leg_amounts_rejects(value):
+    with pytest.raises(ValueError):
+        leg_amounts({"da_days": value, "da_rate": "250"})
+
+
+def test_leg_amounts_rejects_huge_rate():
+    with pytest.raises(ValueError):
+        leg_amounts({"da_days": "999999", "da_rate": "9" * 26})
+
+
+def test_blank_diary():
+    values = diary_values("")
+    assert values["diary_legs"] == 0
+    assert values["diary_total"] == ""
+    assert len(values["diary_rows"]) == 5
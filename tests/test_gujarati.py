@@ -0,0 +1,79 @@
+import pytest
+
+from gujarati import (
+    amount_in_words, convert_many, format_amount, group_digits, number_to_words, parse_amount,
+)
+
+
+@pytest.mark.parametrize("n, words", [
+    (0, "શૂન્ય"),
+    (7, "સાત"),
+    (99, "નવ્વાણું"),
+    (100, "એકસો"),
+    (200, "બસો"),
+    (1000, "એક હજાર"),
+    (12161, "બાર હજાર એકસો એકસઠ"),
+    (100000, "એક લાખ"),
+    (2500050, "પચ્ચીસ લાખ પચાસ"),
+    (10**7, "એક કરોડ"),
+    (123 * 10**7, "એકસો ત્રેવીસ કરોડ"),
+])
+def test_number_to_words(n, words):
+    assert number_to_words(n) == words
+
+
+def test_number_to_words_rejects_negative():
+    with pytest.raises(ValueError):
+        number_to_words(-1)
+
+
+@pytest.mark.parametrize("amount, expected", [
+    ("12161", (12161, 0)),
+    (12161, (12161, 0)),
+    ("10.5", (10, 50)),
+    ("10.05", (10, 5)),
+    ("1,23,456.75", (123456, 75)),
+    ("૧૨૧૬૧", (12161, 0)),
+    (" 0 ", (0, 0)),
+])
+def test_parse_amount(amount, expected):
+    assert parse_amount(amount) == expected
+
+
+@pytest.mark.parametrize("amount", [
+    "", "abc", "-5", "10.005", "nan", "NaN", "sNaN", "Infinity", "-inf",
+    "1e30", "9" * 29, "1e-30",
+])
+def test_parse_amount_rejects(amount):
+    with pytest.raises(ValueError):
+        parse_amount(amount)
+
+
+def test_amount_in_words_fits_after_rupees():
+    assert amount_in_words("12161") == "બાર હજાર એકસો એકસઠ પુરા"
+    assert amount_in_words("10.50") == "દસ અને પચાસ પૈસા"
+    assert "રૂપિયા" not in amount_in_words("10.50")
+
+
+def test_convert_many():
+    assert convert_many(["5", "5", "1.01"]) == ["પાંચ પુરા", "પાંચ પુરા", "એક અને એક પૈસા"]
+
+
+@pytest.mark.parametrize("n, grouped", [
+    (0, "0"),
+    (999, "999"),
+    (1000, "1,000"),
+    (12161, "12,161"),
+    (123456, "1,23,456"),
+    (100000, "1,00,000"),
+    (12345678, "1,23,45,678"),
+    (1000000000, "1,00,00,00,000"),
+])
+def test_group_digits(n, grouped):
+    assert group_digits(n) == grouped
+
+
+def test_format_amount():
+    assert format_amount("12161") == "૧૨,૧૬૧"
+    assert format_amount("123456.5") == "૧,૨૩,૪૫૬.૫૦"
+    assert format_amount("૧૦૦૦") == "૧,૦૦૦"
@@ -0,0 +1,58 @@
+import pytest
+
+from register import BillRegister, to_paise
+
+
+@pytest.fixture
+def register():
+    register = BillRegister(":memory:")
+    register.set_budget("H1", "2025-26", "1000")
+    yield register
+    register.close()
+
+
+def _bill(amount, head="H1"):
+    return {"employee_name": "E", "amount": amount, "budget_head": head, "budget_year": "2025-26"}
+
+
+def test_to_paise():
+    assert to_paise("12161") == 1216100
+    assert to_paise("1,000.05") == 100005
+    assert to_paise("૧૦.૫") == 1050
+
+
+def test_add_bill_charges_the_budget(register):
+    _, first = register.add_bill(_bill("100"))
+    _, second = register.add_bill(_bill("250.50"))
+    assert (first["budget_spent"], first["budget_balance"]) == ("100", "900")
+    assert (second["budget_spent"], second["budget_balance"]) == ("350.50", "649.50")
+    assert second["budget_sanctioned"] == "1000"
+
+
+def test_overspent_balance_is_negative(register):
+    register.add_bill(_bill("900"))
+    _, fields = register.add_bill(_bill("100.25"))
+    assert (fields["budget_spent"], fields["budget_balance"]) == ("1000.25", "-0.25")
+
+
+def test_budget_fields_count_the_bill_and_unrecorded_amounts(register):
+    register.add_bill(_bill("100"))
+    assert register.budget_fields(_bill("50")) == {
+        "budget_sanctioned": "1000", "budget_spent": "150", "budget_balance": "850"}
+    assert register.budget_fields(_bill("50"), unrecorded=2025)["budget_spent"] == "170.25"
+    # Only adding a bill charges the budget
+    assert register.budget_fields(_bill("0"))["budget_spent"] == "100"
+
+
+def test_bill_without_budget(register):
+    assert register.budget_fields(_bill("50", head="")) == {}
+    assert register.budget_fields(_bill("50", head="H2")) == {}
+    _, fields = register.add_bill(_bill("50", head="H2"))
+    assert "budget_spent" not in fields or not fields["budget_spent"]
+
+
+def test_get_bill_returns_stored_fields(register):
+    bill_id, fields = register.add_bill(_bill("100"), "8")
+    assert register.get_bill(bill_id) == fields
+    with pytest.raises(KeyError):
+        register.get_bill(bill_id + 1)
@@ -0,0 +1,45 @@
+import json
+
+from diary import journeys_amount
+from rules import apply_entitlements, check_claims, entitlements
+
+LEGS = [
+    {"mode": "train", "travel_class": "1ac", "fare": "3000", "km": "500", "da_days": "2", "da_rate": "600"},
+    {"mode": "own car", "mileage_km": "100", "mileage_rate": "12", "km": "100"},
+]
+
+
+def _claim(pay_level, legs=LEGS):
+    return {"pay_level": pay_level, "journeys": json.dumps(legs)}
+
+
+def test_violations():
+    found = check_claims([_claim("3"), _claim("12")])
+    assert found[1] == [
+        "journey 1: daily allowance rate above the entitled rate",
+        "journey 1: travel class above entitlement",
+        "journey 1: fare above the entitled class's fare for the distance",
+        "journey 2: mileage rate above the entitled rate for the mode",
+    ]
+    assert found[2] == ["journey 2: mileage rate above the entitled rate for the mode"]
+
+
+def test_fractional_pay_level_is_flagged():
+    messages = check_claims([_claim("3.5")])[1]
+    assert "journey 1: pay level missing, unknown or not a whole number" in messages
+
+
+def test_entitlements():
+    entitled = entitlements([_claim("3"), _claim("12")])
+    assert entitled.loc[1].tolist() == [400.0, 600.0, 800.0]  # fare as sleeper, Rs. 300 a day
+    assert entitled.loc[2].tolist() == [3000.0, 1400.0, 800.0]
+
+
+def test_apply_entitlements():
+    claims = [_claim("3"), _claim("12"), _claim("")]
+    applied = apply_entitlements(claims)
+    assert claims[0]["journeys"] == json.dumps(LEGS)  # the input is left alone
+    assert [journeys_amount(claim["journeys"]) for claim in applied] == ["1800", "5000", "5000"]
+    assert applied[0]["amount_words"] == ""
+    # Without a pay level only the mileage rate, which depends on the mode alone, is limited
+    assert json.loads(applied[2]["journeys"])[0] == LEGS[0]
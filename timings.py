@@ -0,0 +1,226 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+import weakref
+
+# ---------------------------------------------------------
+# 1. STARTUP REPORT
+# ---------------------------------------------------------
+# The first script run in a fresh process pays for every import; that run's
+# import and first-paint times are what container autoscaling waits on. They
+# are printed once per process and, if BILL_STARTUP_LOG names a file, appended
+# to it as JSON lines so releases can be compared.
+STARTUP_LOG = os.environ.get("BILL_STARTUP_LOG")
+
+_reported = None
+
+
+def report_startup(script_start, imports_done, first_paint):
+    """Record the first run's timings (perf_counter values); later calls are
+    no-ops and return the report from the first run."""
+    global _reported
+    if _reported is not None:
+        return _reported
+    _reported = {
+        "time": time.time(),
+        "pid": os.getpid(),
+        "import_ms": round((imports_done - script_start) * 1000, 1),
+        "first_paint_ms": round((first_paint - script_start) * 1000, 1),
+        "docx_loaded": "docx" in sys.modules,
+    }
+    print("startup: %s" % json.dumps(_reported), file=sys.stderr)
+    if STARTUP_LOG:
+        with open(STARTUP_LOG, "a") as f:
+            f.write(json.dumps(_reported) + "\n")
+    return _reported
+
+# ---------------------------------------------------------
+# 2. RERUN METRICS
+# ---------------------------------------------------------
+# Per-rerun instrumentation: wall time of each stage of the script, counts and
+# byte sizes (HTML sent, blocks re-rendered, .docx built, ...) and, when
+# memory tracing is on, the tracemalloc peak of each stage. Off by default;
+#   BILL_METRICS=1           instrument every rerun of every session
+#   ?metrics=1 in the URL    instrument this session and show the panel
+#   BILL_METRICS_MEMORY=1    also trace memory (slows Python down noticeably)
+#   BILL_METRICS_LOG=path    append each rerun as a JSON line ("-": stderr)
+#   BILL_METRICS_PROM=path   keep a Prometheus text file of the process totals
+#                            (for node_exporter's textfile collector)
+METRICS = os.environ.get("BILL_METRICS") == "1"
+METRICS_MEMORY = os.environ.get("BILL_METRICS_MEMORY") == "1"
+METRICS_LOG = os.environ.get("BILL_METRICS_LOG")
+METRICS_PROM = os.environ.get("BILL_METRICS_PROM")
+
+_totals_lock = threading.Lock()
+_stage_totals = {}  # stage -> [seconds, calls]
+_last_values = {}  # name -> last value seen
+_runs = 0
+
+# tracemalloc is process-wide: it is started once and left running, and its
+# peak counter is reset by only one run at a time. Runs that overlap the one
+# measuring go without peaks. A run that never finishes (st.rerun, st.stop)
+# gives up its claim when it is garbage-collected.
+_memory_lock = threading.Lock()
+_memory_owner = None  # weakref to the RunMetrics recording peaks
+
+
+def _claim_memory(run):
+    global _memory_owner
+    with _memory_lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if _memory_owner is not None and _memory_owner() is not None:
+            return False
+        _memory_owner = weakref.ref(run)
+        tracemalloc.reset_peak()
+        return True
+
+
+def _release_memory(run):
+    global _memory_owner
+    with _memory_lock:
+        if _memory_owner is not None and _memory_owner() is run:
+            _memory_owner = None
+
+
+class RunMetrics:
+    """Stage timings of one rerun, taken as laps: lap(name) closes the stage
+    that ran since the previous lap (or since the metrics were created)."""
+
+    def __init__(self, enabled=True, memory=False):
+        self.enabled = enabled
+        self.memory = memory and enabled
+        self.stages = {}  # name -> ms
+        self.peaks = {}  # name -> bytes
+        self.values = {}  # counts and sizes
+        if self.memory:
+            self.memory = _claim_memory(self)
+        self._last = time.perf_counter()
+
+    def lap(self, name):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.stages[name] = self.stages.get(name, 0) + (now - self._last) * 1000
+        if self.memory:
+            self.peaks[name] = max(self.peaks.get(name, 0), tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self._last = now
+
+    def add(self, name, value):
+        if self.enabled:
+            self.values[name] = self.values.get(name, 0) + value
+
+    def finish(self):
+        """Close the run: log it, fold it into the process totals and return
+        the report (None when disabled)."""
+        if not self.enabled:
+            return None
+        if self.memory:
+            _release_memory(self)
+        report = {
+            "time": time.time(),
+            "pid": os.getpid(),
+            "stages_ms": {name: round(ms, 2) for name, ms in self.stages.items()},
+            "values": self.values,
+        }
+        if self.peaks:
+            report["peak_bytes"] = self.peaks
+        record(report["stages_ms"], self.values, run=True)
+        _log(report)
+        return report
+
+
+def _log(report):
+    if METRICS_LOG == "-":
+        print("metrics: %s" % json.dumps(report), file=sys.stderr)
+    elif METRICS_LOG:
+        with open(METRICS_LOG, "a") as f:
+            f.write(json.dumps(report) + "\n")
+
+
+def record(stages_ms, values=None, run=False):
+    """Add stage timings (and last values) to the process totals, e.g. for
+    work done outside a rerun such as a download being built."""
+    global _runs
+    with _totals_lock:
+        _runs += bool(run)
+        for name, ms in stages_ms.items():
+            total = _stage_totals.setdefault(name, [0.0, 0])
+            total[0] += ms / 1000
+            total[1] += 1
+        _last_values.update(values or {})
+        text = _prometheus_text() if METRICS_PROM else None
+    if text is not None:
+        tmp = METRICS_PROM + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, METRICS_PROM)
+
+
+def timed(name, fn, *args, enabled=METRICS):
+    """fn(*args), recorded as stage `name` (with the result's size) when
+    metrics are on. The result may be bytes or an open file."""
+    if not enabled:
+        return fn(*args)
+    start = time.perf_counter()
+    result = fn(*args)
+    ms = (time.perf_counter() - start) * 1000
+    size = os.fstat(result.fileno()).st_size if hasattr(result, "fileno") else len(result)
+    record({name: ms}, {name + "_bytes": size})
+    _log({"time": time.time(), "pid": os.getpid(), "stages_ms": {name: round(ms, 2)},
+          "values": {name + "_bytes": size}})
+    return result
+
+
+def prometheus_text():
+    """The process totals in the Prometheus text exposition format."""
+    with _totals_lock:
+        return _prometheus_text()
+
+
+def _prometheus_text():
+    lines = [
+        "# HELP bill_reruns_total Instrumented script reruns.",
+        "# TYPE bill_reruns_total counter",
+        "bill_reruns_total %d" % _runs,
+        "# HELP bill_stage_seconds Time spent per stage.",
+        "# TYPE bill_stage_seconds summary",
+    ]
+    for name, (seconds, calls) in sorted(_stage_totals.items()):
+        lines.append('bill_stage_seconds_sum{stage="%s"} %.6f' % (name, seconds))
+        lines.append('bill_stage_seconds_count{stage="%s"} %d' % (name, calls))
+    lines += ["# HELP bill_last_value Last recorded count or size.", "# TYPE bill_last_value gauge"]
+    for name, value in sorted(_last_values.items()):
+        lines.append('bill_last_value{name="%s"} %s' % (name, value))
+    return "\n".join(lines) + "\n"
+
+# ---------------------------------------------------------
+# 3. COLD IMPORT CHECK (python timings.py)
+# ---------------------------------------------------------
+# The modules app.py imports before the preview is painted. None of them may
+# pull in python-docx; that only happens when a download is requested.
+PREVIEW_MODULES = ("bill_layout", "diary", "fonts", "jobs", "layout", "pdf_export", "receipts", "register", "timings")
+
+
+def cold_import_ms(modules=PREVIEW_MODULES):
+    """Import `modules` in a fresh interpreter; return (ms, python-docx loaded)."""
+    code = (
+        "import sys, time; t = time.perf_counter()\n"
+        "import %s\n"
+        "print((time.perf_counter() - t) * 1000, 'docx' in sys.modules)" % ", ".join(modules)
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__)))
+    ms, docx_loaded = out.stdout.split()
+    return float(ms), docx_loaded == "True"
+
+
+if __name__ == "__main__":
+    ms, docx_loaded = cold_import_ms()
+    print(json.dumps({"cold_import_ms": round(ms, 1), "docx_loaded": docx_loaded}))
+    sys.exit(1 if docx_loaded else 0)